@@ -25,6 +25,10 @@ DATA_DIR = BASE_DIR / "data"
 CLIENTS_FILE = DATA_DIR / "clients.json"
 CHROMA_PERSIST_DIR = str(BASE_DIR / "chroma_db")
 
+# Optional Chroma server; when unset the local persistent store is used
+CHROMA_HOST = os.getenv("CHROMA_HOST", "")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+
 # LLM Configuration
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq")  # "groq" (free) or "openai"
 
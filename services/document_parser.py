@@ -3,8 +3,11 @@ Document Parser Service
 Extracts client data from Word (.docx) and Excel (.xlsx) files
 """
 
+import os
 import re
-from datetime import date, datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import lru_cache
 from typing import Dict, Any, Optional, List, Tuple
 from io import BytesIO
 
@@ -15,6 +18,8 @@ class DocumentParser:
     Uses pattern matching to find common client information fields.
     """
     
+    __slots__ = ('_docx_available', '_openpyxl_available')
+    
     # Required fields for a valid client
     REQUIRED_FIELDS = [
         "id", "title", "first_name", "last_name", "date_of_birth",
@@ -41,9 +46,84 @@ class DocumentParser:
         "ni_number": r"(?:national\s*insurance|ni\s*number|nino)?[:\s]*([A-Z]{2}\d{6}[A-Z])",
     }
     
+    # Lowercase literals a pattern cannot match without (fields not listed always run)
+    FIELD_ANCHORS = {
+        "title": ("title", "salutation", "mr/mrs"),
+        "first_name": ("first", "forename", "given"),
+        "last_name": ("last", "surname", "family"),
+        "full_name": ("name",),
+        "date_of_birth": ("dob", "birth", "d.o.b"),
+        "email": ("@",),
+        "phone": ("07", "+44"),
+        "address": ("address", "street", "residence"),
+        "city": ("city", "town"),
+        "occupation": ("occupation", "job", "profession"),
+        "employer": ("employer", "company", "organisation", "organization"),
+        "income": ("£", "$"),
+        "portfolio": ("portfolio", "net", "total", "assets"),
+        "marital": ("marital", "marriage", "relationship"),
+    }
+    
+    # Compiled once and shared by every instance
+    _COMPILED_FIELD_PATTERNS = {
+        field: re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+        for field, pattern in FIELD_PATTERNS.items()
+    }
+    
     # UK postcode pattern
     UK_POSTCODE = r"[A-Z]{1,2}\d{1,2}[A-Z]?\s*\d[A-Z]{2}"
     
+    # Name and household patterns
+    _RE_CLIENT_HEADER = re.compile(
+        r'CLIENT\s*\d*[:\s]+([A-Z][A-Za-z]+)(?:\s*(?:&|AND)\s*([A-Z][A-Za-z]+))?\s+([A-Z][A-Za-z]+)',
+        re.IGNORECASE
+    )
+    _RE_COUPLE = re.compile(
+        r'CLIENT\s*\d*[:\s]+([A-Z][A-Za-z]+)\s*(?:&|AND)\s*([A-Z][A-Za-z]+)\s+([A-Z][A-Za-z]+)',
+        re.IGNORECASE
+    )
+    _RE_PERSONAL_DETAILS = re.compile(
+        r'PERSONAL\s+DETAILS\s*\n+([A-Z][a-z]+)\s+([A-Z][a-z]+)', re.IGNORECASE
+    )
+    _RE_NAME_BEFORE_DOB = re.compile(
+        r'([A-Z][a-z]+)\s+([A-Z][a-z]+)\s*\n\s*(?:DOB|Date\s*of\s*Birth)', re.IGNORECASE
+    )
+    
+    # Money patterns
+    _RE_OCCUPATION_INCOME = re.compile(r'[A-Za-z]+:\s+([A-Za-z][A-Za-z\s,]+?)\s*[–-]\s*£[\d,]+')
+    _RE_INCOME = re.compile(r'[–-]\s*£([\d,]+)')
+    _RE_NET_WORTH = re.compile(r'Net\s*Worth[:\s]*£([\d,]+)', re.IGNORECASE)
+    _RE_NUMBER_NOISE = re.compile(r'[£$,\s]')
+    
+    # Words that mark a spreadsheet cell as a field label
+    _RE_LABEL = re.compile(
+        r"name|first|last|surname|email|phone|tel|address|city|postcode|dob|birth"
+        r"|occupation|employer|income|salary|title|marital",
+        re.IGNORECASE
+    )
+    
+    # Generated client IDs ("client_001")
+    _RE_CLIENT_ID = re.compile(r'client_(\d+)$')
+    
+    # "Address: line1, [more lines,] [city,] POSTCODE" in one pass
+    _RE_ADDRESS_FULL = re.compile(
+        r"(?:Address|Residence)[:\s]*(?P<line1>[^,\n]+),\s*"
+        r"(?P<line2>(?:[^,\n]+,\s*)*?)(?:(?P<city>[^,\n]+),\s*)?"
+        r"(?P<postcode>" + UK_POSTCODE + r")",
+        re.IGNORECASE
+    )
+    
+    # Day-first dates (dd/mm/yyyy, dd-mm-yy, dd.mm.yyyy) and ISO-style dates
+    _RE_DATE_DMY = re.compile(r"(\d{1,2})([/\-.])(\d{1,2})\2(\d{4}|\d{2})")
+    _RE_DATE_YMD = re.compile(r"(\d{4})([/\-])(\d{1,2})\2(\d{1,2})")
+    
+    # Last-resort patterns searched anywhere in the text (in priority order)
+    FALLBACK_PATTERNS = {
+        "email": r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}",
+        "postcode": r"(?i:" + UK_POSTCODE + r")",
+        "phone": r"07\d{3}\s*\d{3}\s*\d{3,4}",
+    }
+    
     # Common titles
     VALID_TITLES = ["Mr", "Mrs", "Ms", "Miss", "Dr", "Prof", "Sir", "Dame"]
     
@@ -85,7 +165,7 @@ class DocumentParser:
         elif filename_lower.endswith('.xlsx') or filename_lower.endswith('.xls'):
             extracted = self._parse_excel(file_content)
         elif filename_lower.endswith('.txt'):
-            text = file_content.decode('utf-8', errors='ignore')
+            text = self._decode_text(file_content)
             extracted = self._extract_from_text(text)
         else:
             extracted = {}
@@ -95,6 +175,29 @@ class DocumentParser:
         
         return extracted, missing
     
+    def parse_documents_batch(
+        self,
+        files: List[Tuple[bytes, str]],
+        max_workers: Optional[int] = None
+    ) -> List[Tuple[Dict[str, Any], List[str]]]:
+        """
+        Parse several documents in parallel worker processes.
+        
+        Args:
+            files: List of (file_content, filename) tuples
+            max_workers: Number of worker processes (defaults to the CPU count)
+            
+        Returns:
+            List of (extracted_data dict, missing fields) tuples, in input order
+        """
+        if len(files) < 2:
+            return [self.parse_document(content, filename) for content, filename in files]
+        
+        workers = min(max_workers or os.cpu_count() or 1, len(files))
+        contents, filenames = zip(*files)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.parse_document, contents, filenames))
+    
     def parse_document_multi(self, file_content: bytes, filename: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
         Parse a document and extract data for multiple people (e.g., couples).
@@ -107,7 +210,7 @@ class DocumentParser:
         if filename_lower.endswith('.docx'):
             text = self._get_docx_text(file_content)
         elif filename_lower.endswith('.txt'):
-            text = file_content.decode('utf-8', errors='ignore')
+            text = self._decode_text(file_content)
         else:
             # For other formats, fall back to single extraction
             extracted, _ = self.parse_document(file_content, filename)
@@ -115,6 +218,15 @@ class DocumentParser:
         
         return self._extract_multiple_people(text)
     
+    def _decode_text(self, file_content: bytes) -> str:
+        """Decode a plain text upload (UTF-16 with BOM, ASCII or UTF-8)"""
+        if file_content.startswith((b'\xff\xfe', b'\xfe\xff')):
+            return file_content.decode('utf-16', errors='ignore')
+        if file_content.isascii():
+            # Pure ASCII skips UTF-8 validation
+            return file_content.decode('ascii')
+        return file_content.decode('utf-8', errors='ignore')
+    
     def _get_docx_text(self, file_content: bytes) -> str:
         """Extract text from Word document"""
         if not self._docx_available:
@@ -149,32 +261,15 @@ class DocumentParser:
         # These apply to the household
         
         # Address
-        address_match = re.search(
-            r'Address[:\s]*([^,\n]+(?:,\s*[^,\n]+)*,\s*[A-Z]{1,2}\d{1,2}[A-Z]?\s*\d[A-Z]{2})',
-            text, re.IGNORECASE
-        )
-        if address_match:
-            addr_parts = address_match.group(1).split(',')
-            if len(addr_parts) >= 2:
-                shared["address_line1"] = addr_parts[0].strip()
-                # Find city (usually second-to-last before postcode)
-                if len(addr_parts) >= 3:
-                    shared["city"] = addr_parts[-2].strip()
-                # Postcode is in the last part
-                postcode_match = re.search(r'([A-Z]{1,2}\d{1,2}[A-Z]?\s*\d[A-Z]{2})', addr_parts[-1].upper())
-                if postcode_match:
-                    shared["postcode"] = postcode_match.group(1)
+        shared.update(self._match_address(text))
         
         # Net Worth / Portfolio
-        networth_match = re.search(r'Net\s*Worth[:\s]*£([\d,]+)', text, re.IGNORECASE)
+        networth_match = self._RE_NET_WORTH.search(text)
         if networth_match:
             shared["portfolio"] = self._clean_number(networth_match.group(1))
         
         # Detect couple format: "CLIENT X: NAME1 & NAME2 SURNAME"
-        couple_match = re.search(
-            r'CLIENT\s*\d*[:\s]+([A-Z][A-Za-z]+)\s*(?:&|AND)\s*([A-Z][A-Za-z]+)\s+([A-Z][A-Za-z]+)',
-            text, re.IGNORECASE
-        )
+        couple_match = self._RE_COUPLE.search(text)
         
         if couple_match:
             name1 = couple_match.group(1).strip().title()
@@ -271,15 +366,15 @@ class DocumentParser:
             # Check first sheet
             ws = wb.active
             
-            # Build text from all cells and also check for key-value pairs
-            full_text = ""
-            for row in ws.iter_rows():
+            # Collect each row's text in one pass alongside the key-value pairs
+            lines = []
+            for row in ws.iter_rows(values_only=True):
                 row_values = []
                 prev_cell = None
                 
-                for cell in row:
-                    if cell.value is not None:
-                        cell_str = str(cell.value).strip()
+                for value in row:
+                    if value is not None:
+                        cell_str = str(value).strip()
                         row_values.append(cell_str)
                         
                         # Check if previous cell was a label
@@ -292,13 +387,15 @@ class DocumentParser:
                     else:
                         prev_cell = None
                 
-                full_text += " | ".join(row_values) + "\n"
+                lines.append(" | ".join(row_values))
             
-            # Also do pattern matching on full text
-            text_extracted = self._extract_from_text(full_text)
+            # Also do pattern matching on the sheet text; the header, name, occupation
+            # and city heuristics need the whole text, and some span several rows
+            lines.append("")
+            pattern_hits = self._extract_from_text("\n".join(lines))
             
             # Merge (direct extraction takes precedence)
-            for key, value in text_extracted.items():
+            for key, value in pattern_hits.items():
                 if key not in extracted:
                     extracted[key] = value
             
@@ -314,13 +411,9 @@ class DocumentParser:
     def _extract_from_text(self, text: str) -> Dict[str, Any]:
         """Extract client data from text using pattern matching"""
         extracted = {}
-        text_lower = text.lower()
         
         # ===== SPECIAL: Extract name from "CLIENT X: NAME & PARTNER NAME" format =====
-        client_header_match = re.search(
-            r'CLIENT\s*\d*[:\s]+([A-Z][A-Za-z]+)(?:\s*(?:&|AND)\s*([A-Z][A-Za-z]+))?\s+([A-Z][A-Za-z]+)',
-            text, re.IGNORECASE
-        )
+        client_header_match = self._RE_CLIENT_HEADER.search(text)
         if client_header_match:
             # Format: "CLIENT 13: JOHNS & WILLY JOHNS" -> first_name=Johns, last_name=Johns
             first = client_header_match.group(1)
@@ -331,43 +424,71 @@ class DocumentParser:
         
         # ===== SPECIAL: Extract name after "PERSONAL DETAILS" section =====
         if "first_name" not in extracted:
-            personal_match = re.search(
-                r'PERSONAL\s+DETAILS\s*\n+([A-Z][a-z]+)\s+([A-Z][a-z]+)',
-                text, re.IGNORECASE
-            )
+            personal_match = self._RE_PERSONAL_DETAILS.search(text)
             if personal_match:
                 extracted["first_name"] = personal_match.group(1).strip().title()
                 extracted["last_name"] = personal_match.group(2).strip().title()
         
         # ===== SPECIAL: Look for "Name Name" followed by "DOB:" pattern =====
         if "first_name" not in extracted:
-            name_dob_match = re.search(
-                r'([A-Z][a-z]+)\s+([A-Z][a-z]+)\s*\n\s*(?:DOB|Date\s*of\s*Birth)',
-                text, re.IGNORECASE
-            )
+            name_dob_match = self._RE_NAME_BEFORE_DOB.search(text)
             if name_dob_match:
                 extracted["first_name"] = name_dob_match.group(1).strip().title()
                 extracted["last_name"] = name_dob_match.group(2).strip().title()
         
         # ===== SPECIAL: Extract address from format "Address: Street, City, POSTCODE" =====
-        address_match = re.search(
-            r'(?:Address|Residence)[:\s]*([^,\n]+),\s*([^,\n]+),\s*([^,\n]+),\s*([A-Z]{1,2}\d{1,2}[A-Z]?\s*\d[A-Z]{2})',
-            text, re.IGNORECASE
-        )
-        if address_match:
-            extracted["address_line1"] = address_match.group(1).strip()
-            # City might be in group 2 or 3
-            city_candidate = address_match.group(3).strip()
-            if len(city_candidate) < 3:
-                city_candidate = address_match.group(2).strip()
-            extracted["city"] = city_candidate
-            extracted["postcode"] = address_match.group(4).strip().upper()
+        extracted.update(self._match_address(text))
         
         # Try each standard pattern
-        for field, pattern in self.FIELD_PATTERNS.items():
+        self._match_field_patterns(text, extracted)
+        
+        # Try to find email, UK postcode and phone (UK mobile format) anywhere
+        fallback_fields = tuple(f for f in self.FALLBACK_PATTERNS if f not in extracted)
+        if fallback_fields:
+            extracted.update(self._scan_fallbacks(text, fallback_fields))
+        
+        # Try to extract occupation from "Name: Job Title – £amount" format
+        if "occupation" not in extracted:
+            # Pattern: "Johns: Regional Radio Presenter – £68,000"
+            occupation_match = self._RE_OCCUPATION_INCOME.search(text)
+            if occupation_match:
+                extracted["occupation"] = occupation_match.group(1).strip().rstrip(',')
+        
+        # Try to extract income from "– £68,000" format
+        if "income" not in extracted:
+            income_match = self._RE_INCOME.search(text)
+            if income_match:
+                extracted["income"] = self._clean_number(income_match.group(1))
+        
+        # Try to extract net worth / portfolio
+        if "portfolio" not in extracted:
+            networth_match = self._RE_NET_WORTH.search(text)
+            if networth_match:
+                extracted["portfolio"] = self._clean_number(networth_match.group(1))
+        
+        # Try to extract city from address line
+        if "city" not in extracted and "postcode" in extracted:
+            # Look for city name before postcode
+            city_match = re.search(
+                r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?),\s*' + extracted["postcode"],
+                text, re.IGNORECASE
+            )
+            if city_match:
+                extracted["city"] = city_match.group(1).strip()
+        
+        return extracted
+    
+    def _match_field_patterns(self, text: str, extracted: Dict[str, Any]):
+        """Run FIELD_PATTERNS over text, filling in fields not already extracted"""
+        text_lower = text.lower()
+        
+        for field, pattern in self._COMPILED_FIELD_PATTERNS.items():
             if field in extracted:  # Skip if already found
                 continue
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+            anchors = self.FIELD_ANCHORS.get(field)
+            if anchors and not any(anchor in text_lower for anchor in anchors):
+                continue  # Cheap substring check rules the pattern out
+            match = pattern.search(text)
             if match:
                 value = match.group(1).strip()
                 
@@ -401,68 +522,43 @@ class DocumentParser:
                 
                 if value:
                     extracted[field] = value
-        
-        # Try to find email anywhere in text
-        if "email" not in extracted:
-            email_match = re.search(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', text)
-            if email_match:
-                extracted["email"] = email_match.group(0)
-        
-        # Try to find UK postcode anywhere
-        if "postcode" not in extracted:
-            postcode_match = re.search(self.UK_POSTCODE, text.upper())
-            if postcode_match:
-                extracted["postcode"] = postcode_match.group(0)
-        
-        # Try to find phone number (UK mobile format)
-        if "phone" not in extracted:
-            phone_match = re.search(r'(07\d{3}\s*\d{3}\s*\d{3,4})', text)
-            if phone_match:
-                extracted["phone"] = phone_match.group(1)
-        
-        # Try to extract occupation from "Name: Job Title – £amount" format
-        if "occupation" not in extracted:
-            # Pattern: "Johns: Regional Radio Presenter – £68,000"
-            occupation_match = re.search(
-                r'[A-Za-z]+:\s+([A-Za-z][A-Za-z\s,]+?)\s*[–-]\s*£[\d,]+',
-                text
-            )
-            if occupation_match:
-                extracted["occupation"] = occupation_match.group(1).strip().rstrip(',')
-        
-        # Try to extract income from "– £68,000" format
-        if "income" not in extracted:
-            income_match = re.search(r'[–-]\s*£([\d,]+)', text)
-            if income_match:
-                extracted["income"] = self._clean_number(income_match.group(1))
-        
-        # Try to extract net worth / portfolio
-        if "portfolio" not in extracted:
-            networth_match = re.search(r'Net\s*Worth[:\s]*£([\d,]+)', text, re.IGNORECASE)
-            if networth_match:
-                extracted["portfolio"] = self._clean_number(networth_match.group(1))
-        
-        # Try to extract city from address line
-        if "city" not in extracted and "postcode" in extracted:
-            # Look for city name before postcode
-            city_match = re.search(
-                r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?),\s*' + extracted["postcode"],
-                text, re.IGNORECASE
-            )
-            if city_match:
-                extracted["city"] = city_match.group(1).strip()
-        
-        return extracted
+    
+    def _match_address(self, text: str) -> Dict[str, str]:
+        """Extract address_line1, city and postcode from a labelled address line"""
+        address_match = self._RE_ADDRESS_FULL.search(text)
+        if not address_match:
+            return {}
+        
+        address = {"address_line1": address_match.group("line1").strip()}
+        
+        # City is usually the part just before the postcode, unless that is too short
+        city = (address_match.group("city") or "").strip()
+        if len(city) < 3 and address_match.group("line2"):
+            city = address_match.group("line2").rstrip(", \t").split(",")[-1].strip()
+        if city:
+            address["city"] = city
+        
+        address["postcode"] = address_match.group("postcode").strip().upper()
+        return address
+    
+    def _scan_fallbacks(self, text: str, fields: Tuple[str, ...]) -> Dict[str, str]:
+        """Find the first match of each fallback field in a single pass over the text"""
+        found = {}
+        for match in _fallback_scanner(fields).finditer(text):
+            field = match.lastgroup
+            if field not in found:
+                found[field] = match.group()
+                if len(found) == len(fields):
+                    break
+        
+        if "postcode" in found:
+            found["postcode"] = found["postcode"].upper()
+        
+        return {field: found[field] for field in fields if field in found}
     
     def _is_label(self, text: str) -> bool:
         """Check if text looks like a field label"""
-        labels = [
-            "name", "first", "last", "surname", "email", "phone", "tel",
-            "address", "city", "postcode", "dob", "birth", "occupation",
-            "employer", "income", "salary", "title", "marital"
-        ]
-        text_lower = text.lower()
-        return any(label in text_lower for label in labels)
+        return self._RE_LABEL.search(text) is not None
     
     def _label_to_field(self, label: str) -> Optional[str]:
         """Convert a label to a field name"""
@@ -503,26 +599,29 @@ class DocumentParser:
         """Clean and convert a number string"""
         try:
             # Remove currency symbols, commas, spaces
-            cleaned = re.sub(r'[£$,\s]', '', value)
+            cleaned = self._RE_NUMBER_NOISE.sub('', value)
             return float(cleaned)
         except:
             return None
     
     def _parse_date(self, value: str) -> Optional[str]:
         """Parse various date formats to ISO format"""
-        formats = [
-            "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y",
-            "%d/%m/%y", "%d-%m-%y", "%d.%m.%y",
-            "%Y-%m-%d", "%Y/%m/%d",
-        ]
-        
-        for fmt in formats:
-            try:
-                parsed = datetime.strptime(value, fmt)
-                return parsed.date().isoformat()
-            except:
-                continue
-        return value
+        match = self._RE_DATE_DMY.fullmatch(value)
+        if match:
+            day, month, year = int(match.group(1)), int(match.group(3)), int(match.group(4))
+            if len(match.group(4)) == 2:
+                # Two-digit years are dates of birth: 00-49 -> 2000s, 50-99 -> 1900s
+                year += 2000 if year < 50 else 1900
+        else:
+            match = self._RE_DATE_YMD.fullmatch(value)
+            if not match:
+                return value
+            year, month, day = int(match.group(1)), int(match.group(3)), int(match.group(4))
+        
+        try:
+            return date(year, month, day).isoformat()
+        except ValueError:
+            return value
     
     def _normalize_marital_status(self, value: str) -> str:
         """Normalize marital status value"""
@@ -580,17 +679,33 @@ class DocumentParser:
         
         return missing
     
-    def generate_client_id(self, existing_ids: List[str]) -> str:
-        """Generate a unique client ID"""
-        max_num = 0
-        for cid in existing_ids:
-            match = re.search(r'client_(\d+)', cid)
-            if match:
-                num = int(match.group(1))
-                max_num = max(max_num, num)
+    def generate_client_id(self, existing_ids: List[str], max_num: int = 0) -> str:
+        """
+        Generate a unique client ID.
+        
+        Args:
+            existing_ids: IDs already in use
+            max_num: Highest client number the caller already knows about. Bulk
+                imports can track this across calls and pass an empty
+                existing_ids, instead of rescanning every ID for each new client.
+        """
+        nums = (
+            int(match.group(1))
+            for cid in existing_ids
+            if (match := self._RE_CLIENT_ID.match(cid))
+        )
+        max_num = max(max_num, max(nums, default=0))
         
         return f"client_{max_num + 1:03d}"
 
 
+@lru_cache(maxsize=None)
+def _fallback_scanner(fields: Tuple[str, ...]) -> "re.Pattern[str]":
+    """Compile the requested fallback patterns into one named-group alternation"""
+    return re.compile("|".join(
+        f"(?P<{field}>{DocumentParser.FALLBACK_PATTERNS[field]})" for field in fields
+    ))
+
+
 # Singleton instance
 document_parser = DocumentParser()
@@ -6,16 +6,20 @@ Direct API integration without MCP server complexity
 import os
 import json
 import base64
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, List, Dict, Any, Tuple
+from functools import lru_cache
+from urllib.parse import urlencode, quote
+from email.header import Header
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-# Import config
-import sys
-sys.path.insert(0, str(Path(__file__).parent.parent))
-
+# Import config (the repo root is on sys.path when the app runs: streamlit run app.py)
 from config import (
     GOOGLE_CREDENTIALS_PATH, 
     GOOGLE_TOKEN_PATH, 
@@ -27,6 +31,200 @@ from config import (
 )
 
 
+# Resolved once; the token directory is created on the first save
+_TOKEN_PATH = Path(GOOGLE_TOKEN_PATH)
+_USER_INFO_PATH = _TOKEN_PATH.with_suffix('.userinfo.json')
+_CRED_PATH = Path(GOOGLE_CREDENTIALS_PATH)
+_TOKEN_DIR_READY = False
+
+
+def _ensure_token_dir():
+    """Create the token directory the first time anything is saved there"""
+    global _TOKEN_DIR_READY
+    if not _TOKEN_DIR_READY:
+        _TOKEN_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _TOKEN_DIR_READY = True
+
+
+# Gmail accepts at most 100 calls in one batch request
+GMAIL_BATCH_LIMIT = 100
+
+# Calendar recommends keeping batch requests to 50 calls
+CALENDAR_BATCH_LIMIT = 50
+
+# Seconds that email and calendar reads are served from cache
+RESPONSE_CACHE_TTL = 30
+
+# Map common timezone abbreviations to IANA timezone names
+_TZ_MAP = {
+    'IST': 'Asia/Kolkata',
+    'GMT': 'Europe/London',
+    'BST': 'Europe/London',
+    'EST': 'America/New_York',
+    'PST': 'America/Los_Angeles',
+    'UTC': 'UTC',
+}
+_LOCAL_TIMEZONE = _TZ_MAP.get(time.tzname[0], 'Asia/Kolkata')  # Default to IST for India
+
+try:
+    from zoneinfo import ZoneInfo
+    _LOCAL_ZONE = ZoneInfo(_LOCAL_TIMEZONE)
+except Exception:  # No zoneinfo module or tz database
+    _LOCAL_ZONE = None
+
+try:
+    from ciso8601 import parse_datetime as _parse_iso_datetime  # C parser, accepts 'Z' directly
+except ImportError:
+    def _parse_iso_datetime(value: str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _event_time(dt: datetime) -> Dict[str, str]:
+    """Calendar start/end body for dt, with the offset encoded in the timestamp when possible"""
+    if dt.tzinfo is None and _LOCAL_ZONE is not None:
+        dt = dt.replace(tzinfo=_LOCAL_ZONE)
+    if dt.tzinfo is not None:
+        return {'dateTime': dt.isoformat()}
+    return {'dateTime': dt.isoformat(), 'timeZone': _LOCAL_TIMEZONE}
+
+
+def _header_value(value: str) -> str:
+    """Strip CR/LF so a header value can't inject extra headers"""
+    return value.replace('\r', ' ').replace('\n', ' ')
+
+
+def _build_raw_plain(to: str, subject: str, body: str) -> str:
+    """Build a base64url RFC 822 plain-text message without going through the email generator"""
+    subject = _header_value(subject)
+    if not subject.isascii():
+        subject = Header(subject, 'utf-8').encode()
+    
+    message = (
+        f"To: {_header_value(to)}\r\n"
+        f"Subject: {subject}\r\n"
+        "MIME-Version: 1.0\r\n"
+        "Content-Type: text/plain; charset=utf-8\r\n"
+        "Content-Transfer-Encoding: 8bit\r\n"
+        "\r\n"
+        f"{body}"
+    )
+    return base64.urlsafe_b64encode(message.encode('utf-8')).decode('ascii')
+
+
+def _build_raw_message(to: str, subject: str, body: str, html: bool) -> str:
+    """Build the base64url raw message for the Gmail send/draft APIs"""
+    if not html:
+        return _build_raw_plain(to, subject, body)
+    
+    message = MIMEMultipart('alternative')
+    message.attach(MIMEText(body, 'html'))
+    message['to'] = to
+    message['subject'] = subject
+    return base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+
+
+# Placeholders in create_event_and_notify emails that are filled in from the created event
+_EVENT_PLACEHOLDERS = ('{event_id}', '{event_link}')
+
+
+# Refresh access tokens in the background this long before they expire
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+# Shared keep-alive session for OAuth token calls (created on first use)
+_http_session = None
+
+
+def get_http_session():
+    """Get the pooled requests session used for token exchange and refresh"""
+    global _http_session
+    if _http_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.2)
+        ))
+        _http_session = session
+    return _http_session
+
+
+GOOGLE_AUTH_ENDPOINT = "https://accounts.google.com/o/oauth2/v2/auth"
+
+# Auth URL query parameters that are the same for every login
+_AUTH_STATIC_PARAMS = urlencode({
+    'response_type': 'code',
+    'scope': ' '.join(GOOGLE_SCOPES),
+    'access_type': 'offline',
+    'prompt': 'consent',
+}, quote_via=quote)
+
+
+@lru_cache(maxsize=8)
+def build_auth_url(client_id: str, redirect_uri: str) -> str:
+    """Build the OAuth consent URL for a client ID and redirect URI"""
+    params = urlencode({'client_id': client_id, 'redirect_uri': redirect_uri}, quote_via=quote)
+    return f"{GOOGLE_AUTH_ENDPOINT}?{params}&{_AUTH_STATIC_PARAMS}"
+
+
+@lru_cache(maxsize=None)
+def google_libs_available() -> bool:
+    """Check once per process whether the Google API libraries are installed"""
+    try:
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from googleapiclient.discovery import build
+        return True
+    except ImportError:
+        return False
+
+
+@lru_cache(maxsize=None)
+def _discovery_document(service_name: str, version: str) -> Optional[Dict[str, Any]]:
+    """Parse the discovery document bundled with googleapiclient, once per process"""
+    from googleapiclient import discovery_cache
+    doc = discovery_cache.get_static_doc(service_name, version)
+    return json.loads(doc) if doc else None
+
+
+def build_service(service_name: str, version: str, http):
+    """Build an API client from the bundled discovery document, without a discovery fetch"""
+    from googleapiclient.discovery import build, build_from_document
+    doc = _discovery_document(service_name, version)
+    if doc is None:
+        return build(service_name, version, http=http)
+    return build_from_document(doc, http=http)
+
+
+def _user_info_from_id_token(id_token: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Read the profile claims from an OpenID Connect id_token.
+    The token comes straight from Google's token endpoint over TLS, so the
+    signature isn't verified here.
+    """
+    if not id_token:
+        return None
+    try:
+        payload = id_token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return None
+    
+    if not claims.get('email'):
+        return None
+    return {
+        'email': claims.get('email', ''),
+        'name': claims.get('name', ''),
+        'given_name': claims.get('given_name', ''),
+        'picture': claims.get('picture', ''),
+        'id': claims.get('sub', '')
+    }
+
+
 def get_redirect_uri():
     """Get the appropriate redirect URI based on environment"""
     # First check if explicitly configured
@@ -44,24 +242,24 @@ class GoogleService:
         self.creds = None
         self.gmail_service = None
         self.calendar_service = None
+        self._authed_http = None  # One authorized transport shared by all API clients
         self._authenticated = False
         self._google_available = self._check_google_libs()
         self._user_info = None  # Store logged in user info
+        self._refresh_lock = threading.Lock()
+        self._refresh_timer: Optional[threading.Timer] = None
+        self._client_info_cache: Optional[Tuple[str, str]] = None
+        self._client_info_mtime = 0.0
+        self._cache: Dict[tuple, Tuple[float, Any]] = {}  # key -> (monotonic time, value)
     
     def _check_google_libs(self) -> bool:
         """Check if Google API libraries are installed"""
-        try:
-            from google.oauth2.credentials import Credentials
-            from google_auth_oauthlib.flow import InstalledAppFlow
-            from googleapiclient.discovery import build
-            return True
-        except ImportError:
-            return False
+        return google_libs_available()
     
     def is_enabled(self) -> bool:
         """Check if Google integration is enabled and credentials exist"""
         # Check for credentials file OR Streamlit secrets
-        has_file_creds = Path(GOOGLE_CREDENTIALS_PATH).exists()
+        has_file_creds = _CRED_PATH.exists()
         has_secret_creds = bool(GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET)
         
         return (
@@ -70,26 +268,21 @@ class GoogleService:
             (has_file_creds or has_secret_creds)
         )
     
-    def is_authenticated(self) -> bool:
-        """Check if we have valid authentication"""
-        return self._authenticated and self.creds is not None and self.creds.valid
-    
-    def get_auth_url(self) -> Tuple[str, Any]:
+    def _load_client_info(self) -> Tuple[Optional[str], Optional[str]]:
         """
-        Get OAuth authorization URL for user to authenticate.
-        Returns (auth_url, None) - we don't need the flow object anymore.
+        Get (client_id, client_secret) from Streamlit secrets or the credentials file.
+        The file is parsed once and only re-read when its modification time changes.
         """
-        if not self.is_enabled():
-            raise ValueError("Google integration not enabled or credentials missing")
+        if GOOGLE_CLIENT_ID:
+            return GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET
         
-        import json
-        
-        # Get client ID - from secrets or file
-        client_id = GOOGLE_CLIENT_ID
+        try:
+            mtime = _CRED_PATH.stat().st_mtime
+        except OSError:
+            return GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET
         
-        if not client_id and Path(GOOGLE_CREDENTIALS_PATH).exists():
-            # Load from file
-            with open(GOOGLE_CREDENTIALS_PATH) as f:
+        if self._client_info_cache is None or mtime != self._client_info_mtime:
+            with open(_CRED_PATH) as f:
                 client_config = json.load(f)
             
             # Get client info (handle both "web" and "installed" formats)
@@ -98,29 +291,27 @@ class GoogleService:
             else:
                 client_info = client_config["installed"]
             
-            client_id = client_info["client_id"]
-        
-        # Get redirect URI
-        redirect_uri = get_redirect_uri()
+            self._client_info_cache = (client_info["client_id"], client_info["client_secret"])
+            self._client_info_mtime = mtime
         
-        # Build auth URL manually
-        scopes_str = "%20".join([s.replace(":", "%3A").replace("/", "%2F") for s in GOOGLE_SCOPES])
-        
-        # URL encode the redirect URI
-        import urllib.parse
-        encoded_redirect = urllib.parse.quote(redirect_uri, safe='')
+        return self._client_info_cache
+    
+    def is_authenticated(self) -> bool:
+        """Check if we have valid authentication"""
+        return self._authenticated and self.creds is not None and self.creds.valid
+    
+    def get_auth_url(self) -> Tuple[str, Any]:
+        """
+        Get OAuth authorization URL for user to authenticate.
+        Returns (auth_url, None) - we don't need the flow object anymore.
+        """
+        if not self.is_enabled():
+            raise ValueError("Google integration not enabled or credentials missing")
         
-        auth_url = (
-            f"https://accounts.google.com/o/oauth2/v2/auth?"
-            f"client_id={client_id}&"
-            f"redirect_uri={encoded_redirect}&"
-            f"response_type=code&"
-            f"scope={scopes_str}&"
-            f"access_type=offline&"
-            f"prompt=consent"
-        )
+        # Get client ID - from secrets or file
+        client_id, _ = self._load_client_info()
         
-        return auth_url, None
+        return build_auth_url(client_id, get_redirect_uri()), None
     
     def complete_auth_with_code(self, auth_code: str) -> Tuple[bool, str]:
         """
@@ -131,27 +322,10 @@ class GoogleService:
             return False, "Google integration not enabled"
             
         try:
-            import json
-            import requests
             from google.oauth2.credentials import Credentials
             
             # Get client credentials - from secrets or file
-            client_id = GOOGLE_CLIENT_ID
-            client_secret = GOOGLE_CLIENT_SECRET
-            
-            if not client_id and Path(GOOGLE_CREDENTIALS_PATH).exists():
-                # Load from file
-                with open(GOOGLE_CREDENTIALS_PATH) as f:
-                    client_config = json.load(f)
-                
-                # Get client info (handle both "web" and "installed" formats)
-                if "web" in client_config:
-                    client_info = client_config["web"]
-                else:
-                    client_info = client_config["installed"]
-                
-                client_id = client_info["client_id"]
-                client_secret = client_info["client_secret"]
+            client_id, client_secret = self._load_client_info()
             
             # Get redirect URI
             redirect_uri = get_redirect_uri()
@@ -167,7 +341,7 @@ class GoogleService:
                 "grant_type": "authorization_code"
             }
             
-            response = requests.post(token_url, data=data)
+            response = get_http_session().post(token_url, data=data, timeout=10)
             
             if response.status_code != 200:
                 error_data = response.json()
@@ -184,14 +358,15 @@ class GoogleService:
                 token_uri="https://oauth2.googleapis.com/token",
                 client_id=client_id,
                 client_secret=client_secret,
-                scopes=GOOGLE_SCOPES
+                scopes=GOOGLE_SCOPES,
+                id_token=token_data.get("id_token")
             )
             
             # Save credentials for future use
             self._save_credentials()
             
-            # Initialize services
-            self._init_services()
+            # Initialize services, taking the profile from the id_token when present
+            self._init_services(user_info=_user_info_from_id_token(token_data.get("id_token")))
             self._authenticated = True
             
             return True, ""
@@ -233,26 +408,27 @@ class GoogleService:
         from google.auth.transport.requests import Request
         
         # Try to load existing token
-        if Path(GOOGLE_TOKEN_PATH).exists():
+        if _TOKEN_PATH.is_file():
             try:
                 self.creds = Credentials.from_authorized_user_file(
-                    GOOGLE_TOKEN_PATH, 
+                    str(_TOKEN_PATH), 
                     GOOGLE_SCOPES
                 )
             except Exception:
                 self.creds = None
         
-        # Check if credentials need refresh
+        # Check if credentials need refresh (fallback when the background refresh hasn't run)
         if self.creds and self.creds.expired and self.creds.refresh_token:
             try:
-                self.creds.refresh(Request())
-                self._save_credentials()
+                with self._refresh_lock:
+                    self.creds.refresh(Request(session=get_http_session()))
+                    self._save_credentials()
             except Exception:
                 self.creds = None
         
         # If we have valid credentials, initialize services
         if self.creds and self.creds.valid:
-            self._init_services()
+            self._init_services(use_cached_user_info=True)
             self._authenticated = True
             return True
         
@@ -261,18 +437,73 @@ class GoogleService:
     def _save_credentials(self):
         """Save credentials to token file"""
         if self.creds:
-            Path(GOOGLE_TOKEN_PATH).parent.mkdir(parents=True, exist_ok=True)
-            with open(GOOGLE_TOKEN_PATH, 'w') as token:
+            _ensure_token_dir()
+            with open(_TOKEN_PATH, 'w') as token:
                 token.write(self.creds.to_json())
     
-    def _init_services(self):
-        """Initialize Gmail and Calendar API services"""
+    def _init_services(self, use_cached_user_info: bool = False, user_info: Optional[Dict[str, str]] = None):
+        """
+        Initialize Gmail and Calendar API services.
+        
+        Args:
+            use_cached_user_info: Reuse the profile saved next to the token instead of
+                fetching it (for sessions restored from a saved token)
+            user_info: Profile already known from the token response; skips the fetch
+        """
         if self.creds:
-            from googleapiclient.discovery import build
-            self.gmail_service = build('gmail', 'v1', credentials=self.creds)
-            self.calendar_service = build('calendar', 'v3', credentials=self.creds)
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            
+            # Never serve another session's cached reads
+            self.invalidate()
+            
+            # Share one connection so Gmail, Calendar and userinfo calls reuse it
+            self._authed_http = AuthorizedHttp(self.creds, http=httplib2.Http())
+            self.gmail_service = build_service('gmail', 'v1', self._authed_http)
+            self.calendar_service = build_service('calendar', 'v3', self._authed_http)
             # Fetch user profile info on login
-            self._fetch_user_info()
+            if user_info:
+                self._user_info = user_info
+                self._save_user_info()
+            elif not (use_cached_user_info and self._load_user_info()):
+                self._fetch_user_info()
+            # Keep the token fresh so API calls never wait on a refresh
+            self._schedule_refresh()
+    
+    def _schedule_refresh(self):
+        """Schedule a background token refresh shortly before the current token expires"""
+        self._cancel_refresh()
+        if not (self.creds and self.creds.refresh_token and self.creds.expiry):
+            return
+        
+        # Credentials expiry is a naive UTC datetime
+        delay = (self.creds.expiry - datetime.utcnow() - TOKEN_REFRESH_MARGIN).total_seconds()
+        self._refresh_timer = threading.Timer(max(delay, 0), self._background_refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+    
+    def _cancel_refresh(self):
+        """Cancel any pending background token refresh"""
+        if self._refresh_timer:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+    
+    def _background_refresh(self):
+        """Refresh the access token off the request path, then schedule the next refresh"""
+        from google.auth.transport.requests import Request
+        
+        with self._refresh_lock:
+            if not self.creds:
+                return
+            try:
+                self.creds.refresh(Request(session=get_http_session()))
+                self._save_credentials()
+            except Exception as e:
+                # authenticate() still refreshes inline once the token has expired
+                print(f"Background token refresh failed: {e}")
+                return
+        
+        self._schedule_refresh()
     
     def _fetch_user_info(self):
         """Fetch the logged in user's profile information"""
@@ -280,8 +511,7 @@ class GoogleService:
             return
         
         try:
-            from googleapiclient.discovery import build
-            oauth2_service = build('oauth2', 'v2', credentials=self.creds)
+            oauth2_service = build_service('oauth2', 'v2', self._authed_http)
             user_info = oauth2_service.userinfo().get().execute()
             self._user_info = {
                 'email': user_info.get('email', ''),
@@ -304,6 +534,35 @@ class GoogleService:
                 }
             except:
                 self._user_info = None
+        
+        self._save_user_info()
+    
+    def refresh_user_info(self) -> Optional[Dict[str, str]]:
+        """Re-fetch the logged in user's profile from Google and update the saved copy"""
+        if self.is_authenticated():
+            self._fetch_user_info()
+        return self._user_info
+    
+    def _load_user_info(self) -> bool:
+        """Load the cached user profile. Returns True if one was found."""
+        try:
+            with open(_USER_INFO_PATH) as f:
+                self._user_info = json.load(f)
+            return bool(self._user_info)
+        except (OSError, ValueError):
+            return False
+    
+    def _save_user_info(self):
+        """Save the user profile next to the token so restored sessions skip the fetch"""
+        try:
+            if self._user_info:
+                _ensure_token_dir()
+                with open(_USER_INFO_PATH, 'w') as f:
+                    json.dump(self._user_info, f)
+            else:
+                _USER_INFO_PATH.unlink(missing_ok=True)
+        except OSError as e:
+            print(f"Error saving user info: {e}")
     
     def get_logged_in_user(self) -> Optional[Dict[str, str]]:
         """Get the currently logged in user's info"""
@@ -311,15 +570,43 @@ class GoogleService:
     
     def logout(self):
         """Logout the current user"""
-        self._authenticated = False
-        self.creds = None
-        self.gmail_service = None
-        self.calendar_service = None
-        self._user_info = None
+        self._cancel_refresh()
         
-        # Remove saved token
-        if Path(GOOGLE_TOKEN_PATH).exists():
-            Path(GOOGLE_TOKEN_PATH).unlink()
+        with self._refresh_lock:
+            self._authenticated = False
+            self.creds = None
+            self.gmail_service = None
+            self.calendar_service = None
+            self._authed_http = None
+            self._user_info = None
+            self.invalidate()
+            
+            # Remove saved token and cached profile
+            _TOKEN_PATH.unlink(missing_ok=True)
+            _USER_INFO_PATH.unlink(missing_ok=True)
+    
+    # ==================== RESPONSE CACHE ====================
+    
+    def _cached(self, key: tuple, fetch):
+        """Return a cached read younger than RESPONSE_CACHE_TTL, otherwise call fetch and cache it"""
+        now = time.monotonic()
+        hit = self._cache.get(key)
+        if hit and now - hit[0] < RESPONSE_CACHE_TTL:
+            return hit[1]
+        
+        value = fetch()
+        self._cache[key] = (now, value)
+        return value
+    
+    def invalidate(self, *kinds: str):
+        """Drop cached reads of the given kinds ('recent', 'search', 'events'), or all if none given"""
+        if not kinds:
+            self._cache.clear()
+            return
+        # Snapshot the keys; writes on worker threads may invalidate concurrently
+        for key in list(self._cache):
+            if key[0] in kinds:
+                self._cache.pop(key, None)
     
     # ==================== GMAIL OPERATIONS ====================
     
@@ -348,24 +635,17 @@ class GoogleService:
         if not self.is_authenticated():
             return False, "Not authenticated with Google"
         
+        # Encode the message
+        return self._send_raw(_build_raw_message(to, subject, body, html))
+    
+    def _send_raw(self, raw: str, http=None) -> Tuple[bool, str]:
+        """Send an encoded message, optionally over a dedicated connection"""
         try:
-            if html:
-                message = MIMEMultipart('alternative')
-                message.attach(MIMEText(body, 'html'))
-            else:
-                message = MIMEText(body)
-            
-            message['to'] = to
-            message['subject'] = subject
-            
-            # Encode the message
-            raw = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-            
-            # Send
             sent = self.gmail_service.users().messages().send(
                 userId='me',
                 body={'raw': raw}
-            ).execute()
+            ).execute(http=http)
+            self.invalidate('recent', 'search')
             
             return True, sent.get('id', 'sent')
         
@@ -387,21 +667,13 @@ class GoogleService:
             return False, "Not authenticated with Google"
         
         try:
-            if html:
-                message = MIMEMultipart('alternative')
-                message.attach(MIMEText(body, 'html'))
-            else:
-                message = MIMEText(body)
-            
-            message['to'] = to
-            message['subject'] = subject
-            
-            raw = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+            raw = _build_raw_message(to, subject, body, html)
             
             draft = self.gmail_service.users().drafts().create(
                 userId='me',
                 body={'message': {'raw': raw}}
             ).execute()
+            self.invalidate('search')
             
             return True, draft.get('id', 'created')
         
@@ -414,34 +686,10 @@ class GoogleService:
             return []
         
         try:
-            results = self.gmail_service.users().messages().list(
-                userId='me',
-                maxResults=max_results,
-                labelIds=['INBOX']
-            ).execute()
-            
-            messages = results.get('messages', [])
-            emails = []
-            
-            for msg in messages:
-                email_data = self.gmail_service.users().messages().get(
-                    userId='me',
-                    id=msg['id'],
-                    format='metadata',
-                    metadataHeaders=['From', 'Subject', 'Date']
-                ).execute()
-                
-                headers = {h['name']: h['value'] for h in email_data.get('payload', {}).get('headers', [])}
-                emails.append({
-                    'id': msg['id'],
-                    'from': headers.get('From', ''),
-                    'subject': headers.get('Subject', ''),
-                    'date': headers.get('Date', ''),
-                    'snippet': email_data.get('snippet', '')
-                })
-            
-            return emails
-        
+            return self._cached(
+                ('recent', max_results),
+                lambda: self._list_emails(maxResults=max_results, labelIds=['INBOX'])
+            )
         except Exception:
             return []
     
@@ -451,36 +699,118 @@ class GoogleService:
             return []
         
         try:
-            results = self.gmail_service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=max_results
-            ).execute()
+            return self._cached(
+                ('search', query, max_results),
+                lambda: self._list_emails(q=query, maxResults=max_results)
+            )
+        except Exception:
+            return []
+    
+    def _list_emails(self, **list_params) -> List[Dict[str, Any]]:
+        """List messages matching list_params and fetch their metadata"""
+        results = self.gmail_service.users().messages().list(
+            userId='me',
+            fields='messages/id,nextPageToken',
+            **list_params
+        ).execute()
+        
+        messages = results.get('messages', [])
+        return self._batch_fetch_metadata([msg['id'] for msg in messages])
+    
+    def _batch_fetch_metadata(self, message_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Fetch From/Subject/Date metadata for messages using Gmail batch requests.
+        Returns email summaries in the same order as message_ids.
+        """
+        responses = {}
+        
+        def collect(request_id, response, exception):
+            if exception is None:
+                responses[request_id] = response
+        
+        messages_api = self.gmail_service.users().messages()
+        for offset in range(0, len(message_ids), GMAIL_BATCH_LIMIT):
+            chunk = message_ids[offset:offset + GMAIL_BATCH_LIMIT]
+            batch = self.gmail_service.new_batch_http_request(callback=collect)
+            for i, message_id in enumerate(chunk, start=offset):
+                batch.add(self._metadata_request(messages_api, message_id), request_id=str(i))
             
-            messages = results.get('messages', [])
-            emails = []
-            
-            for msg in messages:
-                email_data = self.gmail_service.users().messages().get(
-                    userId='me',
-                    id=msg['id'],
-                    format='metadata',
-                    metadataHeaders=['From', 'Subject', 'Date']
-                ).execute()
-                
-                headers = {h['name']: h['value'] for h in email_data.get('payload', {}).get('headers', [])}
-                emails.append({
-                    'id': msg['id'],
-                    'from': headers.get('From', ''),
-                    'subject': headers.get('Subject', ''),
-                    'date': headers.get('Date', ''),
-                    'snippet': email_data.get('snippet', '')
-                })
+            try:
+                batch.execute()
+            except Exception as e:
+                print(f"Gmail batch request failed, fetching messages individually: {e}")
+                responses.update(self._fetch_metadata_concurrently(chunk, start=offset))
+        
+        emails = []
+        for i, message_id in enumerate(message_ids):
+            email_data = responses.get(str(i))
+            if email_data is None:
+                continue
+            
+            sender = subject = sent_date = ''
+            for header in email_data.get('payload', {}).get('headers', []):
+                name = header['name']
+                if name == 'From':
+                    sender = header['value']
+                elif name == 'Subject':
+                    subject = header['value']
+                elif name == 'Date':
+                    sent_date = header['value']
+                else:
+                    continue
+                if sender and subject and sent_date:
+                    break
             
-            return emails
+            emails.append({
+                'id': message_id,
+                'from': sender,
+                'subject': subject,
+                'date': sent_date,
+                'snippet': email_data.get('snippet', '')
+            })
         
-        except Exception:
-            return []
+        return emails
+    
+    def _metadata_request(self, messages_api, message_id: str):
+        """Build a messages.get request returning only the fields shown in email lists"""
+        return messages_api.get(
+            userId='me',
+            id=message_id,
+            format='metadata',
+            metadataHeaders=['From', 'Subject', 'Date'],
+            fields='id,snippet,payload/headers'
+        )
+    
+    def _fetch_metadata_concurrently(self, message_ids: List[str], start: int = 0) -> Dict[str, Any]:
+        """
+        Fetch message metadata with parallel single requests, for when batching is unavailable.
+        Returns responses keyed by request_id (position in the full ID list, as a string).
+        """
+        messages_api = self.gmail_service.users().messages()
+        pending = {
+            str(i): self._metadata_request(messages_api, message_id)
+            for i, message_id in enumerate(message_ids, start=start)
+        }
+        
+        def fetch(request):
+            return request.execute(http=self._thread_http())
+        
+        responses = {}
+        with ThreadPoolExecutor(max_workers=min(10, len(pending))) as executor:
+            futures = {request_id: executor.submit(fetch, request) for request_id, request in pending.items()}
+            for request_id, future in futures.items():
+                try:
+                    responses[request_id] = future.result()
+                except Exception:
+                    continue
+        
+        return responses
+    
+    def _thread_http(self):
+        """New authorized connection for a worker thread; httplib2 connections are not thread-safe"""
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        return AuthorizedHttp(self.creds, http=httplib2.Http())
     
     # ==================== CALENDAR OPERATIONS ====================
     
@@ -489,7 +819,7 @@ class GoogleService:
         if not self.is_authenticated():
             return []
         
-        try:
+        def fetch():
             now = datetime.utcnow()
             time_min = now.isoformat() + 'Z'
             time_max = (now + timedelta(days=days)).isoformat() + 'Z'
@@ -500,7 +830,8 @@ class GoogleService:
                 timeMax=time_max,
                 maxResults=max_results,
                 singleEvents=True,
-                orderBy='startTime'
+                orderBy='startTime',
+                fields='items(id,summary,location,description,start,end,attendees/email)'
             ).execute()
             
             events = events_result.get('items', [])
@@ -515,6 +846,8 @@ class GoogleService:
                 'attendees': [a.get('email') for a in event.get('attendees', [])]
             } for event in events]
         
+        try:
+            return self._cached(('events', days, max_results), fetch)
         except Exception:
             return []
     
@@ -536,55 +869,145 @@ class GoogleService:
             return False, "Not authenticated with Google"
         
         try:
-            # Get local timezone
-            import time
-            local_tz = time.tzname[0]
-            # Map common abbreviations to IANA timezone names
-            tz_map = {
-                'IST': 'Asia/Kolkata',
-                'GMT': 'Europe/London',
-                'BST': 'Europe/London',
-                'EST': 'America/New_York',
-                'PST': 'America/Los_Angeles',
-                'UTC': 'UTC',
-            }
-            timezone = tz_map.get(local_tz, 'Asia/Kolkata')  # Default to IST for India
-            
-            event = {
-                'summary': summary,
-                'location': location,
-                'description': description,
-                'start': {
-                    'dateTime': start_time.isoformat(),
-                    'timeZone': timezone,
-                },
-                'end': {
-                    'dateTime': end_time.isoformat(),
-                    'timeZone': timezone,
-                },
-                'reminders': {
-                    'useDefault': False,
-                    'overrides': [
-                        {'method': 'email', 'minutes': 24 * 60},
-                        {'method': 'popup', 'minutes': 30},
-                    ],
-                },
-            }
-            
-            if attendee_emails:
-                event['attendees'] = [{'email': email} for email in attendee_emails]
-            
-            created = self.calendar_service.events().insert(
-                calendarId='primary',
-                body=event,
-                sendNotifications=send_notifications
-            ).execute()
-            
+            created = self._insert_event(
+                summary, start_time, end_time, description, location,
+                attendee_emails, send_notifications
+            )
             return True, created.get('id', 'created')
         
         except Exception as e:
             return False, f"Calendar error: {e}"
     
+    def _insert_event(
+        self,
+        summary: str,
+        start_time: datetime,
+        end_time: datetime,
+        description: str,
+        location: str,
+        attendee_emails: Optional[List[str]],
+        send_notifications: bool
+    ) -> Dict[str, Any]:
+        """Insert an event into the primary calendar and return the created event; raises on failure"""
+        event = {
+            'summary': summary,
+            'location': location,
+            'description': description,
+            'start': _event_time(start_time),
+            'end': _event_time(end_time),
+            'reminders': {
+                'useDefault': False,
+                'overrides': [
+                    {'method': 'email', 'minutes': 24 * 60},
+                    {'method': 'popup', 'minutes': 30},
+                ],
+            },
+        }
+        
+        if attendee_emails:
+            event['attendees'] = [{'email': email} for email in attendee_emails]
+        
+        created = self.calendar_service.events().insert(
+            calendarId='primary',
+            body=event,
+            sendNotifications=send_notifications
+        ).execute()
+        self.invalidate('events')
+        return created
+    
+    def create_event_and_notify(
+        self,
+        summary: str,
+        start_time: datetime,
+        end_time: datetime,
+        attendee_emails: List[str],
+        email_subject: str,
+        email_body: str,
+        description: str = "",
+        location: str = "",
+        send_notifications: bool = True,
+        html: bool = False
+    ) -> Tuple[Tuple[bool, str], Tuple[bool, str]]:
+        """
+        Create a calendar event and email its attendees.
+        
+        If the subject or body contains {event_id} or {event_link}, the email
+        waits for the insert, is filled in from the created event, and is only
+        sent if the event was created. Otherwise the two calls run in parallel,
+        and the email goes out even if the insert fails.
+        Returns ((success, event_id or error), (success, message_id or error))
+        """
+        if not self.is_authenticated():
+            return (False, "Not authenticated with Google"), (False, "Not authenticated with Google")
+        
+        if not attendee_emails:
+            event_result = self.create_event(
+                summary, start_time, end_time, description, location,
+                send_notifications=send_notifications
+            )
+            return event_result, (False, "No attendees to notify")
+        
+        to = ', '.join(attendee_emails)
+        if any(p in text for p in _EVENT_PLACEHOLDERS for text in (email_subject, email_body)):
+            try:
+                created = self._insert_event(
+                    summary, start_time, end_time, description, location,
+                    attendee_emails, send_notifications
+                )
+            except Exception as e:
+                return (False, f"Calendar error: {e}"), (False, "Event not created; attendees were not emailed")
+            
+            event_id = created.get('id', 'created')
+            fields = {'{event_id}': event_id, '{event_link}': created.get('htmlLink', '')}
+            for placeholder, value in fields.items():
+                email_subject = email_subject.replace(placeholder, value)
+                email_body = email_body.replace(placeholder, value)
+            return (True, event_id), self._send_raw(_build_raw_message(to, email_subject, email_body, html))
+        
+        raw = _build_raw_message(to, email_subject, email_body, html)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # The send gets its own connection; the insert uses the shared one on this thread
+            email_future = executor.submit(self._send_raw, raw, self._thread_http())
+            event_result = self.create_event(
+                summary, start_time, end_time, description, location,
+                attendee_emails, send_notifications
+            )
+            email_result = email_future.result()
+        
+        return event_result, email_result
+    
+    def _fetch_busy_times(self, days_ahead: int) -> List[Tuple[datetime, datetime]]:
+        """Busy intervals from the freebusy API, falling back to upcoming events"""
+        now = datetime.utcnow()
+        try:
+            result = self.calendar_service.freebusy().query(body={
+                'timeMin': now.isoformat() + 'Z',
+                'timeMax': (now + timedelta(days=days_ahead)).isoformat() + 'Z',
+                'items': [{'id': 'primary'}]
+            }).execute()
+            periods = result.get('calendars', {}).get('primary', {}).get('busy', [])
+        except Exception:
+            periods = self.get_upcoming_events(days=days_ahead, max_results=50)
+        
+        busy_times = []
+        for period in periods:
+            start_str = period.get('start')
+            end_str = period.get('end')
+            if start_str and end_str:
+                try:
+                    busy_times.append((self._parse_busy_time(start_str), self._parse_busy_time(end_str)))
+                except ValueError:
+                    pass
+        return busy_times
+    
+    @staticmethod
+    def _parse_busy_time(value: str) -> datetime:
+        """Parse an RFC3339 timestamp or date into a naive local datetime"""
+        parsed = _parse_iso_datetime(value)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone().replace(tzinfo=None)
+        return parsed
+    
     def find_free_slots(
         self, 
         duration_minutes: int = 60,
@@ -599,66 +1022,54 @@ class GoogleService:
             return []
         
         try:
-            # Get existing events
-            events = self.get_upcoming_events(days=days_ahead, max_results=50)
-            
-            # Parse busy times
-            busy_times = []
-            for event in events:
-                start_str = event.get('start')
-                end_str = event.get('end')
-                if start_str and end_str:
-                    try:
-                        # Handle both datetime and date-only formats
-                        if 'T' in str(start_str):
-                            start = datetime.fromisoformat(start_str.replace('Z', '+00:00'))
-                            end = datetime.fromisoformat(end_str.replace('Z', '+00:00'))
-                        else:
-                            start = datetime.strptime(start_str, '%Y-%m-%d')
-                            end = datetime.strptime(end_str, '%Y-%m-%d')
-                        busy_times.append((start.replace(tzinfo=None), end.replace(tzinfo=None)))
-                    except:
-                        pass
-            
-            # Find free slots
-            free_slots = []
+            busy_times = self._fetch_busy_times(days_ahead)
+            
             current = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
             end_search = current + timedelta(days=days_ahead)
             
-            while current < end_search:
-                # Skip weekends
-                if current.weekday() >= 5:
-                    current += timedelta(days=1)
-                    current = current.replace(hour=working_hours[0])
-                    continue
-                
-                # Skip outside working hours
-                if current.hour < working_hours[0]:
-                    current = current.replace(hour=working_hours[0])
-                    continue
-                if current.hour >= working_hours[1]:
-                    current += timedelta(days=1)
-                    current = current.replace(hour=working_hours[0])
-                    continue
-                
-                slot_end = current + timedelta(minutes=duration_minutes)
-                
-                # Check if slot conflicts with busy times
-                is_free = True
-                for busy_start, busy_end in busy_times:
-                    if not (slot_end <= busy_start or current >= busy_end):
-                        is_free = False
-                        break
-                
-                if is_free:
-                    free_slots.append({
-                        'start': current,
-                        'end': slot_end
-                    })
-                    if len(free_slots) >= 10:  # Limit results
-                        break
-                
-                current += timedelta(minutes=30)
+            # Bit i of each mask is the tick starting i * tick minutes after midnight today.
+            # Ticks divide both the 30-minute slot grid and the duration, so checks stay exact.
+            tick = math.gcd(30, int(duration_minutes)) or 30
+            span = max(1, math.ceil(duration_minutes / tick))  # Ticks covered by one meeting
+            origin = current.replace(hour=0)
+            first = int((current - origin).total_seconds()) // 60 // tick
+            last = int((end_search - origin).total_seconds()) // 60 // tick
+            
+            # Candidate starts: every 30 minutes within working hours on weekdays
+            ticks_per_day = 24 * 60 // tick
+            day_starts = 0
+            for t in range(working_hours[0] * 60 // tick, working_hours[1] * 60 // tick, 30 // tick):
+                day_starts |= 1 << t
+            candidates = 0
+            for day in range(days_ahead + 1):
+                if (origin + timedelta(days=day)).weekday() < 5:
+                    candidates |= day_starts << (day * ticks_per_day)
+            candidates &= ((1 << last) - 1) & ~((1 << first) - 1)
+            
+            # Mark every tick a busy interval touches
+            busy = 0
+            for busy_start, busy_end in busy_times:
+                lo = max(0, math.floor((busy_start - origin).total_seconds() / 60 / tick))
+                hi = min(last + span, math.ceil((busy_end - origin).total_seconds() / 60 / tick))
+                if hi > lo:
+                    busy |= ((1 << (hi - lo)) - 1) << lo
+            
+            # A start is blocked if any of the span ticks from it is busy
+            blocked = 0
+            for shift in range(span):
+                blocked |= busy >> shift
+            free = candidates & ~blocked
+            
+            # Emit the earliest free starts, lowest bit first
+            free_slots = []
+            while free and len(free_slots) < 10:  # Limit results
+                low = free & -free
+                slot_start = origin + timedelta(minutes=(low.bit_length() - 1) * tick)
+                free_slots.append({
+                    'start': slot_start,
+                    'end': slot_start + timedelta(minutes=duration_minutes)
+                })
+                free ^= low
             
             return free_slots
         
@@ -667,18 +1078,57 @@ class GoogleService:
     
     def delete_event(self, event_id: str) -> Tuple[bool, str]:
         """Delete a calendar event"""
+        return self.delete_events([event_id])[event_id]
+    
+    def delete_events(self, event_ids: List[str]) -> Dict[str, Tuple[bool, str]]:
+        """
+        Delete calendar events using Calendar batch requests.
+        Returns {event_id: (success, message)}.
+        """
+        event_ids = list(dict.fromkeys(event_ids))  # Batch request IDs must be unique
         if not self.is_authenticated():
-            return False, "Not authenticated with Google"
+            return {event_id: (False, "Not authenticated with Google") for event_id in event_ids}
         
-        try:
-            self.calendar_service.events().delete(
-                calendarId='primary',
-                eventId=event_id
-            ).execute()
-            return True, "Event deleted"
-        except Exception as e:
-            return False, f"Error: {e}"
+        results = {}
+        
+        def collect(request_id, response, exception):
+            if exception is None:
+                results[request_id] = (True, "Event deleted")
+            else:
+                results[request_id] = (False, f"Error: {exception}")
+        
+        events_api = self.calendar_service.events()
+        for offset in range(0, len(event_ids), CALENDAR_BATCH_LIMIT):
+            chunk = event_ids[offset:offset + CALENDAR_BATCH_LIMIT]
+            try:
+                batch = self.calendar_service.new_batch_http_request(callback=collect)
+                for event_id in chunk:
+                    batch.add(
+                        events_api.delete(calendarId='primary', eventId=event_id),
+                        request_id=event_id
+                    )
+                batch.execute()
+            except Exception as e:
+                for event_id in chunk:
+                    results.setdefault(event_id, (False, f"Error: {e}"))
+        
+        self.invalidate('events')
+        return results
+
+
+# Singleton instance, created on first use so importing this module stays cheap
+_google_service_instance = None
+
+def get_google_service() -> GoogleService:
+    """Get or create singleton Google service instance"""
+    global _google_service_instance
+    if _google_service_instance is None:
+        _google_service_instance = GoogleService()
+    return _google_service_instance
 
 
-# Singleton instance
-google_service = GoogleService()
+def __getattr__(name: str):
+    # Keep `from services.google_service import google_service` working
+    if name == 'google_service':
+        return get_google_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,14 +4,26 @@ Abstraction layer for LLM providers (Groq free tier / OpenAI fallback)
 """
 
 import os
-from typing import Optional, List, Dict, Any
+import re
+import json
+import asyncio
+import threading
+import time
+import hashlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from itertools import islice
+from typing import Optional, List, Dict, Any, Tuple, Iterator
 from abc import ABC, abstractmethod
 
-# Import config
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+try:
+    import orjson  # Faster client-context serialisation when installed
+except ImportError:
+    orjson = None
 
+# Import config (the repo root is on sys.path when the app runs: streamlit run app.py)
 from config import (
     LLM_PROVIDER, 
     GROQ_API_KEY, GROQ_MODEL,
@@ -31,6 +43,147 @@ class BaseLLMProvider(ABC):
     def is_available(self) -> bool:
         """Check if provider is configured and available"""
         pass
+    
+    async def achat(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
+        """Async chat; providers without an async client run chat() in a worker thread"""
+        return await asyncio.to_thread(self.chat, messages, temperature)
+    
+    def chat_stream(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> Iterator[str]:
+        """Yield the response in pieces as it's generated; by default the whole response at once"""
+        yield self.chat(messages, temperature)
+    
+    def prewarm(self):
+        """Open a connection ahead of the first chat; nothing to do by default"""
+        pass
+
+
+# Keep-alive pool shared by the async provider clients inside an async_http_pool() block
+_async_http_pool: ContextVar = ContextVar("_async_http_pool", default=None)
+
+
+@asynccontextmanager
+async def async_http_pool():
+    """
+    Share one pooled httpx.AsyncClient across the async calls inside the block.
+    Nested blocks reuse the outer pool; the outermost closes it on exit, while
+    its event loop is still running (Streamlit starts a new loop per asyncio.run).
+    """
+    if _async_http_pool.get() is not None:
+        yield
+        return
+    
+    pool = []  # Filled by get_async_http_client() on first use
+    token = _async_http_pool.set(pool)
+    try:
+        yield
+    finally:
+        _async_http_pool.reset(token)
+        for client in pool:
+            await client.aclose()
+
+
+def get_async_http_client():
+    """Get the pooled httpx.AsyncClient of the enclosing async_http_pool() block"""
+    pool = _async_http_pool.get()
+    if pool is None:
+        raise RuntimeError("get_async_http_client() must be called inside async_http_pool()")
+    if not pool:
+        import httpx
+        pool.append(httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30),
+            timeout=httpx.Timeout(60.0, connect=10.0)
+        ))
+    return pool[0]
+
+
+# Attempts per provider call (the SDKs' own default of 2 retries). A timed-out
+# attempt is retried with double the timeout; rate limits, connection errors and
+# 5xx responses are retried after an exponential backoff
+REQUEST_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5
+_TRANSIENT_ERRORS = ("RateLimitError", "APIConnectionError", "InternalServerError")
+
+
+def _is_timeout(e: Exception) -> bool:
+    """True for request timeouts from the Groq/OpenAI SDKs or httpx (matched by name so no SDK import is needed)"""
+    return isinstance(e, TimeoutError) or type(e).__name__ in (
+        "APITimeoutError", "TimeoutException", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout"
+    )
+
+
+def _is_transient(e: Exception) -> bool:
+    """True for the errors the SDKs' built-in max_retries would retry: 429s, 5xx and dropped connections"""
+    status = getattr(e, "status_code", None)
+    return type(e).__name__ in _TRANSIENT_ERRORS or status == 429 or (isinstance(status, int) and status >= 500)
+
+
+def _backoff_delay(e: Exception, attempt: int) -> float:
+    """Seconds to wait before retrying a transient error, honouring Retry-After like the SDKs do"""
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    retry_after = headers.get("retry-after") if headers is not None else None
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), 60.0)
+        except ValueError:
+            pass
+    return RETRY_BACKOFF * 2 ** attempt
+
+
+def _call_with_retries(create, request_timeout: float):
+    """Call create(timeout), retrying timeouts with double the timeout and transient errors after a backoff"""
+    timeout = request_timeout
+    for attempt in range(REQUEST_ATTEMPTS):
+        try:
+            return create(timeout)
+        except Exception as e:
+            if attempt == REQUEST_ATTEMPTS - 1:
+                raise
+            if _is_timeout(e):
+                timeout *= 2
+            elif _is_transient(e):
+                time.sleep(_backoff_delay(e, attempt))
+            else:
+                raise
+
+
+async def _acall_with_retries(create, request_timeout: float):
+    """Async version of _call_with_retries"""
+    timeout = request_timeout
+    for attempt in range(REQUEST_ATTEMPTS):
+        try:
+            return await create(timeout)
+        except Exception as e:
+            if attempt == REQUEST_ATTEMPTS - 1:
+                raise
+            if _is_timeout(e):
+                timeout *= 2
+            elif _is_transient(e):
+                await asyncio.sleep(_backoff_delay(e, attempt))
+            else:
+                raise
+
+
+# Provider SDK classes, imported on first use (they pull in httpx, pydantic and anyio)
+_Groq = None
+_OpenAI = None
+
+
+def _lazy_groq():
+    """Import the Groq client class the first time it's needed"""
+    global _Groq
+    if _Groq is None:
+        from groq import Groq
+        _Groq = Groq
+    return _Groq
+
+
+def _lazy_openai():
+    """Import the OpenAI client class the first time it's needed"""
+    global _OpenAI
+    if _OpenAI is None:
+        from openai import OpenAI
+        _OpenAI = OpenAI
+    return _OpenAI
 
 
 class GroqProvider(BaseLLMProvider):
@@ -39,43 +192,120 @@ class GroqProvider(BaseLLMProvider):
     Get API key at: https://console.groq.com/keys
     """
     
-    def __init__(self):
+    def __init__(self, request_timeout: float = 20.0):
         self.api_key = GROQ_API_KEY
         self.model = GROQ_MODEL
-        self.client = None
-        
-        if self.is_available():
-            try:
-                from groq import Groq
-                self.client = Groq(api_key=self.api_key)
-            except ImportError:
-                print("Groq package not installed. Run: pip install groq")
-            except TypeError as e:
-                # Handle httpx/proxies compatibility issue
-                print(f"Groq client init error (likely httpx version issue): {e}")
-                self.client = None
+        self.request_timeout = request_timeout  # Seconds for the first attempt, doubled on each retry
+        self.client = None  # Built on first chat so unused providers never import the SDK
+        self._client_failed = False
+        self._client_lock = threading.Lock()
     
     def is_available(self) -> bool:
         return bool(self.api_key and self.api_key != "your_groq_api_key_here")
     
-    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
-        if not self.client:
+    def _get_client(self):
+        """Create the Groq client on first use"""
+        with self._client_lock:  # The prewarm thread may be building it already
+            if self.client is None and not self._client_failed and self.is_available():
+                try:
+                    self.client = _lazy_groq()(api_key=self.api_key)
+                except ImportError:
+                    print("Groq package not installed. Run: pip install groq")
+                    self._client_failed = True
+                except TypeError as e:
+                    # Handle httpx/proxies compatibility issue
+                    print(f"Groq client init error (likely httpx version issue): {e}")
+                    self._client_failed = True
+        return self.client
+    
+    def prewarm(self):
+        """Build the client and open a pooled connection with a cheap models.list() call"""
+        try:
+            if self._get_client():
+                self.client.with_options(timeout=5.0, max_retries=0).models.list()
+        except Exception:
+            pass  # Best effort; the first chat will connect instead
+    
+    def _get_async_client(self):
+        """AsyncGroq client on the pooled connections of the enclosing async_http_pool() block"""
+        try:
+            from groq import AsyncGroq
+            return AsyncGroq(api_key=self.api_key, http_client=get_async_http_client())
+        except ImportError:
+            print("Groq package not installed. Run: pip install groq")
+            self._client_failed = True
+        except TypeError as e:
+            # Handle httpx/proxies compatibility issue
+            print(f"Groq client init error (likely httpx version issue): {e}")
+            self._client_failed = True
+        return None
+    
+    async def achat(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
+        async with async_http_pool():
+            # Only the async client is needed here, so don't build the sync one
+            client = self._get_async_client() if self.is_available() and not self._client_failed else None
+            if client is None:
+                raise RuntimeError("Groq client not initialized")
+            
+            try:
+                response = await _acall_with_retries(
+                    lambda timeout: client.with_options(max_retries=0, timeout=timeout).chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=2048
+                    ),
+                    self.request_timeout
+                )
+                return response.choices[0].message.content
+            except Exception as e:
+                raise self._api_error(e)
+    
+    @staticmethod
+    def _api_error(e: Exception) -> RuntimeError:
+        """Translate SDK errors into the RuntimeError messages shown in the UI"""
+        # Handle connection errors, API errors, etc.
+        error_msg = str(e)
+        if "APIConnectionError" in error_msg or "Connection error" in error_msg:
+            return RuntimeError(f"Groq API connection failed. Please check your internet connection.")
+        return RuntimeError(f"Groq API error: {error_msg}")
+    
+    def chat_stream(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> Iterator[str]:
+        if not self._get_client():
             raise RuntimeError("Groq client not initialized")
         
         try:
-            response = self.client.chat.completions.create(
+            stream = self.client.with_options(timeout=self.request_timeout).chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=2048
+                max_tokens=2048,
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+        except Exception as e:
+            raise self._api_error(e)
+    
+    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
+        if not self._get_client():
+            raise RuntimeError("Groq client not initialized")
+        
+        try:
+            # Our own retries double the timeout, so turn off the SDK's fixed-timeout retries
+            response = _call_with_retries(
+                lambda timeout: self.client.with_options(max_retries=0, timeout=timeout).chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=2048
+                ),
+                self.request_timeout
             )
             return response.choices[0].message.content
         except Exception as e:
-            # Handle connection errors, API errors, etc.
-            error_msg = str(e)
-            if "APIConnectionError" in error_msg or "Connection error" in error_msg:
-                raise RuntimeError(f"Groq API connection failed. Please check your internet connection.")
-            raise RuntimeError(f"Groq API error: {error_msg}")
+            raise self._api_error(e)
 
 
 class OpenAIProvider(BaseLLMProvider):
@@ -84,59 +314,221 @@ class OpenAIProvider(BaseLLMProvider):
     Get API key at: https://platform.openai.com/api-keys
     """
     
-    def __init__(self):
+    def __init__(self, request_timeout: float = 20.0):
         self.api_key = OPENAI_API_KEY
         self.model = OPENAI_MODEL
-        self.client = None
-        
-        if self.is_available():
-            try:
-                from openai import OpenAI
-                self.client = OpenAI(api_key=self.api_key)
-            except ImportError:
-                print("OpenAI package not installed. Run: pip install openai")
-            except TypeError as e:
-                # Handle httpx/proxies compatibility issue
-                print(f"OpenAI client init error (likely httpx version issue): {e}")
-                self.client = None
+        self.request_timeout = request_timeout  # Seconds for the first attempt, doubled on each retry
+        self.client = None  # Built on first chat so unused providers never import the SDK
+        self._client_failed = False
+        self._client_lock = threading.Lock()
     
     def is_available(self) -> bool:
         return bool(self.api_key and self.api_key != "your_openai_api_key_here")
     
-    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
-        if not self.client:
+    def _get_client(self):
+        """Create the OpenAI client on first use"""
+        with self._client_lock:  # The prewarm thread may be building it already
+            if self.client is None and not self._client_failed and self.is_available():
+                try:
+                    self.client = _lazy_openai()(api_key=self.api_key)
+                except ImportError:
+                    print("OpenAI package not installed. Run: pip install openai")
+                    self._client_failed = True
+                except TypeError as e:
+                    # Handle httpx/proxies compatibility issue
+                    print(f"OpenAI client init error (likely httpx version issue): {e}")
+                    self._client_failed = True
+        return self.client
+    
+    def prewarm(self):
+        """Build the client and open a pooled connection with a cheap models.list() call"""
+        try:
+            if self._get_client():
+                self.client.with_options(timeout=5.0, max_retries=0).models.list()
+        except Exception:
+            pass  # Best effort; the first chat will connect instead
+    
+    def _get_async_client(self):
+        """AsyncOpenAI client on the pooled connections of the enclosing async_http_pool() block"""
+        try:
+            from openai import AsyncOpenAI
+            return AsyncOpenAI(api_key=self.api_key, http_client=get_async_http_client())
+        except ImportError:
+            print("OpenAI package not installed. Run: pip install openai")
+            self._client_failed = True
+        except TypeError as e:
+            # Handle httpx/proxies compatibility issue
+            print(f"OpenAI client init error (likely httpx version issue): {e}")
+            self._client_failed = True
+        return None
+    
+    async def abatch_chat(
+        self,
+        messages_list: List[List[Dict[str, str]]],
+        temperature: float = 0.7,
+        poll_interval: float = 30.0
+    ) -> List[str]:
+        """
+        Run many chats as one OpenAI Batch API job (50% cheaper, completes within 24h).
+        Polls until the job finishes and returns responses in input order.
+        """
+        async with async_http_pool():
+            # Only the async client is needed here, so don't build the sync one
+            client = self._get_async_client() if self.is_available() and not self._client_failed else None
+            if client is None:
+                raise RuntimeError("OpenAI client not initialized")
+            
+            lines = [
+                json.dumps({
+                    "custom_id": str(i),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": self.model,
+                        "messages": messages,
+                        "temperature": temperature,
+                        "max_tokens": 2048
+                    }
+                })
+                for i, messages in enumerate(messages_list)
+            ]
+            batch_file = await client.files.create(
+                file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+                purpose="batch"
+            )
+            batch = await client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                await asyncio.sleep(poll_interval)
+                batch = await client.batches.retrieve(batch.id)
+            
+            if batch.status != "completed" or not batch.output_file_id:
+                raise RuntimeError(f"OpenAI batch {batch.id} ended with status: {batch.status}")
+            
+            output = await client.files.content(batch.output_file_id)
+            responses = {}
+            for line in output.text.splitlines():
+                if line.strip():
+                    result = json.loads(line)
+                    body = (result.get("response") or {}).get("body") or {}
+                    if body.get("choices"):
+                        responses[result["custom_id"]] = body["choices"][0]["message"]["content"]
+            
+            missing = len(messages_list) - len(responses)
+            if missing:
+                raise RuntimeError(f"OpenAI batch {batch.id}: {missing} of {len(messages_list)} requests failed")
+            return [responses[str(i)] for i in range(len(messages_list))]
+    
+    def chat_stream(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> Iterator[str]:
+        if not self._get_client():
             raise RuntimeError("OpenAI client not initialized")
         
-        response = self.client.chat.completions.create(
+        stream = self.client.with_options(timeout=self.request_timeout).chat.completions.create(
             model=self.model,
             messages=messages,
             temperature=temperature,
-            max_tokens=2048
+            max_tokens=2048,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+    
+    async def achat(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
+        async with async_http_pool():
+            # Only the async client is needed here, so don't build the sync one
+            client = self._get_async_client() if self.is_available() and not self._client_failed else None
+            if client is None:
+                raise RuntimeError("OpenAI client not initialized")
+            
+            response = await _acall_with_retries(
+                lambda timeout: client.with_options(max_retries=0, timeout=timeout).chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=2048
+                ),
+                self.request_timeout
+            )
+            
+            return response.choices[0].message.content
+    
+    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
+        if not self._get_client():
+            raise RuntimeError("OpenAI client not initialized")
+        
+        # Our own retries double the timeout, so turn off the SDK's fixed-timeout retries
+        response = _call_with_retries(
+            lambda timeout: self.client.with_options(max_retries=0, timeout=timeout).chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=2048
+            ),
+            self.request_timeout
         )
         
         return response.choices[0].message.content
 
 
-class MockProvider(BaseLLMProvider):
+@lru_cache(maxsize=1)
+def _get_token_encoding():
+    """tiktoken's cl100k_base encoding, or None when tiktoken isn't installed"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def _count_tokens(text: str) -> int:
+    """Token count of text; about 4 characters per token without tiktoken"""
+    encoding = _get_token_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _trim_messages(messages: List[Dict[str, str]], budget: int) -> List[Dict[str, str]]:
     """
-    Mock LLM Provider for testing without API keys
-    Returns template responses
+    Drop the oldest history turns until the messages fit in budget tokens.
+    The system prompt (first) and the current user message (last) are always kept.
     """
-    
-    def is_available(self) -> bool:
-        return True
-    
-    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
-        # Extract the last user message
-        user_message = ""
-        for msg in reversed(messages):
-            if msg.get("role") == "user":
-                user_message = msg.get("content", "").lower()
-                break
-        
-        # Template responses based on keywords
-        if "briefing" in user_message or "morning" in user_message or "today" in user_message:
-            return """Good morning! Here's your daily briefing:
+    # ~4 tokens of per-message framing on top of the content
+    sizes = [_count_tokens(m.get("content") or "") + 4 for m in messages]
+    total = sum(sizes)
+    drop = 0
+    while total > budget and drop < len(messages) - 2:
+        drop += 1
+        total -= sizes[drop]
+    if not drop:
+        return messages
+    return messages[:1] + messages[1 + drop:]
+
+
+# Provider name -> (factory taking the request timeout, display name)
+PROVIDER_FACTORIES = {
+    "groq": (lambda request_timeout: GroqProvider(request_timeout), "Groq (Free)"),
+    "openai": (lambda request_timeout: OpenAIProvider(request_timeout), "OpenAI"),
+    "mock": (lambda request_timeout: MockProvider(), "Mock (Testing)"),
+}
+
+
+# Mock provider: keywords in the user's message, the response category each
+# implies, and the canned responses. Earlier categories win when several match.
+_MOCK_PATTERN = re.compile(r"briefing|morning|today|client|patterson|singh|chen|thompson|email|draft")
+_MOCK_CATEGORIES = {
+    "briefing": "briefing", "morning": "briefing", "today": "briefing",
+    "client": "client", "patterson": "client", "singh": "client", "chen": "client", "thompson": "client",
+    "email": "email", "draft": "email",
+}
+_MOCK_PRIORITY = ("briefing", "client", "email")
+_MOCK_RESPONSES = {
+    "briefing": """Good morning! Here's your daily briefing:
 
             📋 **Priority Actions:**
             • 3 clients have overdue annual reviews
@@ -151,10 +543,8 @@ class MockProvider(BaseLLMProvider):
             • Mr. Thompson mentioned daughter's wedding - consider protection review
             • 2 clients approaching tax year end - ISA top-up reminder
 
-            Would you like me to draft any emails or provide more details on any client?"""
-        
-        elif "client" in user_message or any(name in user_message for name in ["patterson", "singh", "chen", "thompson"]):
-            return """Here's what I found about this client:
+            Would you like me to draft any emails or provide more details on any client?""",
+    "client": """Here's what I found about this client:
 
             **Overview:**
             • Long-standing client since 2018
@@ -178,10 +568,8 @@ class MockProvider(BaseLLMProvider):
             • 2 adult children, 3 grandchildren
             • Mentioned daughter's wedding planned for summer
 
-            Would you like me to draft a check-in email or schedule a review?"""
-        
-        elif "email" in user_message or "draft" in user_message:
-            return """Here's a draft email:
+            Would you like me to draft a check-in email or schedule a review?""",
+    "email": """Here's a draft email:
 
             ---
             **Subject:** Checking in - thinking of you
@@ -201,71 +589,142 @@ class MockProvider(BaseLLMProvider):
 
             ---
 
-            Shall I adjust the tone or add anything specific?"""
-        
-        else:
-            return """I'm here to help you stay proactive with your clients. I can:
+            Shall I adjust the tone or add anything specific?""",
+    "default": """I'm here to help you stay proactive with your clients. I can:
 
             • **Daily Briefing** - Show priority actions, overdue reviews, upcoming events
             • **Client Lookup** - Get full context on any client quickly
             • **Draft Emails** - Birthday wishes, review reminders, check-ins
             • **Find Clients** - Search by concerns, last contact, upcoming events
 
-            What would you like to know?"""
+            What would you like to know?""",
+}
 
 
-class LLMService:
+class MockProvider(BaseLLMProvider):
     """
-    Main LLM Service - automatically selects best available provider
-    Priority: Groq (free) -> OpenAI (paid) -> Mock (testing)
+    Mock LLM Provider for testing without API keys
+    Returns template responses
     """
     
-    def __init__(self, force_provider: Optional[str] = None):
-        """
-        Initialize LLM service
+    def is_available(self) -> bool:
+        return True
+    
+    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
+        # Extract the last user message
+        user_message = ""
+        for msg in reversed(messages):
+            if msg.get("role") == "user":
+                user_message = msg.get("content", "").lower()
+                break
         
-        Args:
-            force_provider: Force specific provider ("groq", "openai", "mock")
+        # Template responses based on keywords (substring matches, scanned once)
+        found = {_MOCK_CATEGORIES[keyword] for keyword in _MOCK_PATTERN.findall(user_message)}
+        category = next((c for c in _MOCK_PRIORITY if c in found), "default")
+        return _MOCK_RESPONSES[category]
+
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# One embedding model per process, shared by every cache/service that needs it
+_embedder = None
+
+
+def get_embedder():
+    """Get or load the shared sentence-transformers model"""
+    global _embedder
+    if _embedder is None:
+        from sentence_transformers import SentenceTransformer
+        _embedder = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedder
+
+
+class SemanticCache:
+    """
+    Response cache keyed by prompt embeddings.
+    A prompt reuses a stored response when its embedding is close enough to an
+    earlier prompt asked with the same context and history (the scope).
+    """
+    
+    def __init__(self, threshold: float = 0.92, max_entries: int = 512):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors = None  # (N, dim) float32 matrix of unit-length embeddings
+        self._scopes = None  # (N,) int64 scope hash per row
+        self._responses: List[str] = []
+        self._last_used: List[int] = []  # Use counter per row, for LRU eviction
+        self._clock = 0
+        self.enabled = True
+    
+    def _encode(self, text: str):
+        return get_embedder().encode(text, normalize_embeddings=True, convert_to_numpy=True).astype("float32")
+    
+    def lookup(self, text: str, scope: str) -> Tuple[Optional[str], Any]:
         """
-        self.provider: BaseLLMProvider
-        self.provider_name: str
+        Find a cached response for text within scope.
+        Returns (response or None, embedding to pass to add() on a miss).
+        """
+        if not self.enabled:
+            return None, None
         
-        if force_provider:
-            self.provider, self.provider_name = self._get_provider(force_provider)
-        else:
-            self.provider, self.provider_name = self._auto_select_provider()
+        try:
+            import numpy as np
+            query = self._encode(text)
+        except ImportError:
+            print("sentence-transformers not installed, semantic cache disabled. Run: pip install sentence-transformers")
+            self.enabled = False
+            return None, None
+        except Exception as e:
+            # e.g. the model can't be downloaded offline; the cache is optional, the request isn't
+            print(f"Embedding model unavailable, semantic cache disabled: {e}")
+            self.enabled = False
+            return None, None
         
-        print(f"LLM Service initialized with: {self.provider_name}")
-    
-    def _get_provider(self, name: str) -> tuple[BaseLLMProvider, str]:
-        """Get specific provider by name"""
-        providers = {
-            "groq": (GroqProvider(), "Groq (Free)"),
-            "openai": (OpenAIProvider(), "OpenAI"),
-            "mock": (MockProvider(), "Mock (Testing)"),
-        }
-        return providers.get(name.lower(), (MockProvider(), "Mock (Testing)"))
-    
-    def _auto_select_provider(self) -> tuple[BaseLLMProvider, str]:
-        """Auto-select best available provider"""
-        # Try Groq first (free)
-        groq = GroqProvider()
-        if groq.is_available():
-            return groq, "Groq (Free)"
+        if not self._responses:
+            return None, query
         
-        # Try OpenAI (paid fallback)
-        openai = OpenAIProvider()
-        if openai.is_available():
-            return openai, "OpenAI"
+        # Rows are unit length, so the dot product is the cosine similarity
+        sims = self._vectors @ query
+        sims[self._scopes != hash(scope)] = -1.0
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None, query
         
-        # Fall back to mock
-        print("⚠️  No LLM API keys configured. Using mock responses.")
-        print("   Get free Groq API key at: https://console.groq.com/keys")
-        return MockProvider(), "Mock (Testing)"
+        self._clock += 1
+        self._last_used[best] = self._clock
+        return self._responses[best], query
     
-    def get_system_prompt(self) -> str:
-        """Get the system prompt for Jarvis"""
-        return """You are Jarvis, a proactive AI assistant for UK Independent Financial Advisors (IFAs).
+    def add(self, embedding, scope: str, response: str):
+        """Store a response, evicting the least recently used entry when full"""
+        if embedding is None:
+            return
+        import numpy as np
+        
+        self._clock += 1
+        if len(self._responses) < self.max_entries:
+            row = embedding[np.newaxis, :]
+            scope_row = np.array([hash(scope)], dtype=np.int64)
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            self._scopes = scope_row if self._scopes is None else np.concatenate([self._scopes, scope_row])
+            self._responses.append(response)
+            self._last_used.append(self._clock)
+        else:
+            oldest = min(range(len(self._last_used)), key=self._last_used.__getitem__)
+            self._vectors[oldest] = embedding
+            self._scopes[oldest] = hash(scope)
+            self._responses[oldest] = response
+            self._last_used[oldest] = self._clock
+    
+    def clear(self):
+        """Drop all cached responses"""
+        self._vectors = None
+        self._scopes = None
+        self._responses = []
+        self._last_used = []
+
+
+# System prompt for every chat, built once at import
+_SYSTEM_PROMPT = """You are Jarvis, a proactive AI assistant for UK Independent Financial Advisors (IFAs).
 
     Your role is to help advisors:
     1. Stay proactive instead of reactive
@@ -335,6 +794,131 @@ class LLMService:
     - Annual reviews must happen within 12 months
     - Milestone birthdays (55, 60, 65, 75) have pension significance
     - Tax year ends 5th April (ISA/pension deadlines)"""
+
+
+# Daily briefing sections: (data key, header, item -> context lines). Five items per section.
+_BRIEFING_SECTIONS = (
+    ("reviews_overdue", "\nOVERDUE REVIEWS ({count}):",
+     lambda c: (f"  - {c.full_name}: review was due {c.compliance.next_review_due}",)),
+    ("dormant_90_days", "\nDORMANT CLIENTS - NO CONTACT 90+ DAYS ({count}):",
+     lambda c: (f"  - {c.full_name}: {c.days_since_last_contact} days since contact",)),
+    ("upcoming_birthdays", "\nUPCOMING BIRTHDAYS:",
+     lambda b: (f"  - {b['client'].full_name}: turning {b['turning_age']} in {b['days_until']} days"
+                f"{' (MILESTONE!)' if b['is_milestone'] else ''}",)),
+    ("overdue_follow_ups", "\nOVERDUE FOLLOW-UPS ({count}):",
+     lambda c: (f"  - {c.full_name}: {f.commitment} (was due {f.deadline})" for f in c.overdue_follow_ups)),
+    ("active_concerns", "\nCLIENTS WITH ACTIVE CONCERNS ({count}):",
+     lambda c: (f"  - {c.full_name}: {', '.join(con.topic for con in c.active_concerns)}",)),
+)
+
+
+# Plain-text layout every drafted email must follow
+_FORMAT_INSTRUCTIONS = """
+
+FORMAT REQUIREMENTS:
+- Start directly with "Subject:" line (no markdown heading)
+- Then a blank line
+- Then "Dear [Name]," greeting
+- Write 2-4 paragraphs of body text
+- End with appropriate sign-off like "Kind regards," or "Best wishes,"
+- Sign off with "[Advisor Name]" as placeholder (this email will be sent by the financial advisor, NOT by an AI)
+- Do NOT use any markdown headings (no # symbols)
+- Do NOT use bold or italic formatting
+- Keep it as plain text email format
+- Do NOT sign as "Jarvis" or any AI - this is a draft for the human advisor to send"""
+
+# Full drafting prompt for each email type
+_EMAIL_PROMPTS = {
+    "birthday": f"Draft a warm birthday email for this client. Make it personal by referencing what you know about them (family, interests, recent conversations).{_FORMAT_INSTRUCTIONS}",
+    "review_reminder": f"Draft a professional email reminding this client their annual review is due. Emphasize the value of the review and what you'll cover.{_FORMAT_INSTRUCTIONS}",
+    "check_in": f"Draft a friendly check-in email. Reference any concerns they've expressed or life events happening.{_FORMAT_INSTRUCTIONS}",
+    "follow_up": f"Draft a follow-up email. Reference any commitments made or actions pending.{_FORMAT_INSTRUCTIONS}",
+    "policy_renewal": f"Draft an email about their upcoming policy renewal. Explain the importance of reviewing their cover.{_FORMAT_INSTRUCTIONS}",
+    "policy_maturity": f"Draft an email about their policy reaching maturity. Explain the options available to them.{_FORMAT_INSTRUCTIONS}",
+    "retirement_planning": f"Draft an email about retirement planning. Reference their retirement timeline and any concerns.{_FORMAT_INSTRUCTIONS}",
+    "general_update": f"Draft a general update email. Keep it friendly and reference recent conversations or their situation.{_FORMAT_INSTRUCTIONS}",
+}
+
+
+class LLMService:
+    """
+    Main LLM Service - automatically selects best available provider
+    Priority: Groq (free) -> OpenAI (paid) -> Mock (testing)
+    """
+    
+    # Responses above these temperatures are meant to vary, so they aren't served from cache.
+    # Briefings and insights run at 0.5; email drafts run at 0.7 and must stay uncached
+    # so "Regenerate" returns a fresh draft.
+    SEMANTIC_CACHE_MAX_TEMPERATURE = 0.5
+    EXACT_CACHE_MAX_TEMPERATURE = 0.5
+    EXACT_CACHE_SIZE = 256
+    
+    # Concurrent provider calls allowed when drafting emails in bulk
+    MAX_CONCURRENT_REQUESTS = 10
+    
+    # Input token budget; older conversation turns are dropped to stay within it
+    CONTEXT_TOKEN_BUDGET = 6000
+    
+    def __init__(
+        self,
+        force_provider: Optional[str] = None,
+        cache_enabled: bool = False,
+        request_timeout: float = 20.0
+    ):
+        """
+        Initialize LLM service
+        
+        Args:
+            force_provider: Force specific provider ("groq", "openai", "mock")
+            cache_enabled: Reuse responses for near-duplicate low-temperature prompts
+                (needs sentence-transformers)
+            request_timeout: Seconds before a provider call is retried (doubled per retry)
+        """
+        self.request_timeout = request_timeout
+        self.provider: BaseLLMProvider
+        self.provider_name: str
+        
+        if force_provider:
+            self.provider, self.provider_name = self._get_provider(force_provider)
+        else:
+            self.provider, self.provider_name = self._auto_select_provider()
+        
+        self.semantic_cache = SemanticCache() if cache_enabled else None
+        self._system_prompt = self.get_system_prompt()
+        self._exact_cache: "OrderedDict[str, str]" = OrderedDict()  # sha256 of request -> response
+        self._exact_cache_lock = threading.Lock()  # The service is shared by every Streamlit session
+        
+        print(f"LLM Service initialized with: {self.provider_name}")
+        
+        # Move SDK import and TCP/TLS handshake off the first user request
+        if not isinstance(self.provider, MockProvider):
+            threading.Thread(target=self.provider.prewarm, daemon=True).start()
+    
+    def _get_provider(self, name: str) -> tuple[BaseLLMProvider, str]:
+        """Get specific provider by name"""
+        factory, provider_name = PROVIDER_FACTORIES.get(name.lower(), PROVIDER_FACTORIES["mock"])
+        return factory(self.request_timeout), provider_name
+    
+    def _auto_select_provider(self) -> tuple[BaseLLMProvider, str]:
+        """Auto-select best available provider"""
+        # Check keys before constructing anything so only the chosen provider is built
+        # Try Groq first (free)
+        if GROQ_API_KEY and GROQ_API_KEY != "your_groq_api_key_here":
+            return GroqProvider(self.request_timeout), "Groq (Free)"
+        
+        # Try OpenAI (paid fallback)
+        if OPENAI_API_KEY and OPENAI_API_KEY != "your_openai_api_key_here":
+            return OpenAIProvider(self.request_timeout), "OpenAI"
+        
+        # Fall back to mock
+        print("⚠️  No LLM API keys configured. Using mock responses.")
+        print("   Get free Groq API key at: https://console.groq.com/keys")
+        return MockProvider(), "Mock (Testing)"
+    
+    @classmethod
+    def get_system_prompt(cls) -> str:
+        """Get the system prompt for Jarvis"""
+        return _SYSTEM_PROMPT
     
     def chat(
         self, 
@@ -355,12 +939,84 @@ class LLMService:
         Returns:
             Assistant's response
         """
+        messages = self._build_messages(user_message, context, conversation_history)
+        cached, pending = self._check_cache(messages, user_message, context, conversation_history, temperature)
+        if cached is not None:
+            return cached
+        
+        # Get response
+        response = self.provider.chat(messages, temperature)
+        self._store_cache(pending, response)
+        return response
+    
+    def chat_stream(
+        self, 
+        user_message: str, 
+        context: Optional[str] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.7
+    ) -> Iterator[str]:
+        """
+        Like chat(), but yields the response in pieces as it arrives so the UI can
+        start rendering straight away (e.g. with st.write_stream)
+        """
+        messages = self._build_messages(user_message, context, conversation_history)
+        cached, pending = self._check_cache(messages, user_message, context, conversation_history, temperature)
+        if cached is not None:
+            yield cached
+            return
+        
+        parts = []
+        for part in self.provider.chat_stream(messages, temperature):
+            parts.append(part)
+            yield part
+        
+        # Only complete responses are cached; an abandoned stream never gets here
+        self._store_cache(pending, "".join(parts))
+    
+    async def achat(
+        self, 
+        user_message: str, 
+        context: Optional[str] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.7
+    ) -> str:
+        """Async version of chat(); concurrent calls share pooled keep-alive connections"""
+        messages = self._build_messages(user_message, context, conversation_history)
+        cached, pending = self._check_cache(messages, user_message, context, conversation_history, temperature)
+        if cached is not None:
+            return cached
+        
+        response = await self.provider.achat(messages, temperature)
+        self._store_cache(pending, response)
+        return response
+    
+    async def achat_batch(self, requests: List[Dict[str, Any]]) -> List[str]:
+        """
+        Run several chats concurrently.
+        
+        Args:
+            requests: achat() keyword arguments for each chat
+        
+        Returns:
+            Responses in the same order as requests
+        """
+        async with async_http_pool():
+            return await asyncio.gather(*(self.achat(**request) for request in requests))
+    
+    def _build_messages(
+        self,
+        user_message: str,
+        context: Optional[str],
+        conversation_history: Optional[List[Dict[str, str]]]
+    ) -> List[Dict[str, str]]:
+        """Assemble the system prompt, history and user message for a provider"""
         messages = []
         
         # System prompt
-        system_content = self.get_system_prompt()
+        system_content = self._system_prompt
         if context:
-            system_content += f"\n\n--- CURRENT CONTEXT ---\n{context}"
+            system_content = f"{system_content}\n\n--- CURRENT CONTEXT ---\n{context}"
         
         messages.append({"role": "system", "content": system_content})
         
@@ -370,9 +1026,54 @@ class LLMService:
         
         # Add current user message
         messages.append({"role": "user", "content": user_message})
+        return _trim_messages(messages, self.CONTEXT_TOKEN_BUDGET)
+    
+    def _check_cache(
+        self,
+        messages: List[Dict[str, str]],
+        user_message: str,
+        context: Optional[str],
+        conversation_history: Optional[List[Dict[str, str]]],
+        temperature: float
+    ) -> Tuple[Optional[str], Tuple]:
+        """
+        Look a request up in the exact and semantic caches.
+        Returns (cached response or None, state to pass to _store_cache on a miss).
+        """
+        # Identical requests (e.g. a briefing rerun after a UI refresh) reuse the earlier answer
+        exact_key = None
+        if temperature <= self.EXACT_CACHE_MAX_TEMPERATURE:
+            exact_key = hashlib.sha256(json.dumps(
+                {"m": messages, "t": temperature, "model": self.provider_name},
+                sort_keys=True, default=str
+            ).encode()).hexdigest()
+            with self._exact_cache_lock:
+                cached = self._exact_cache.get(exact_key)
+                if cached is not None:
+                    self._exact_cache.move_to_end(exact_key)
+                    return cached, ()
         
-        # Get response
-        return self.provider.chat(messages, temperature)
+        # Near-duplicate questions about the same context can reuse an earlier answer
+        scope = embedding = None
+        if self.semantic_cache is not None and temperature <= self.SEMANTIC_CACHE_MAX_TEMPERATURE:
+            scope = repr((context, conversation_history))
+            cached, embedding = self.semantic_cache.lookup(user_message, scope)
+            if cached is not None:
+                return cached, ()
+        
+        return None, (exact_key, scope, embedding)
+    
+    def _store_cache(self, pending: Tuple, response: str):
+        """Remember a fresh response in the caches it missed"""
+        exact_key, scope, embedding = pending
+        if embedding is not None:
+            self.semantic_cache.add(embedding, scope, response)
+        if exact_key is not None:
+            with self._exact_cache_lock:
+                self._exact_cache[exact_key] = response
+                self._exact_cache.move_to_end(exact_key)
+                if len(self._exact_cache) > self.EXACT_CACHE_SIZE:
+                    self._exact_cache.popitem(last=False)
     
     def generate_daily_briefing(self, briefing_data: Dict[str, Any]) -> str:
         """Generate daily briefing from structured data"""
@@ -401,74 +1102,78 @@ class LLMService:
         additional_context: Optional[str] = None
     ) -> str:
         """Draft an email for a client"""
+        prompt, context = self._email_request(client_summary, email_type, additional_context)
+        return self.chat(user_message=prompt, context=context, temperature=0.7)
+    
+    async def adraft_emails(
+        self,
+        items: List[Tuple[Dict[str, Any], str, Optional[str]]],
+        use_batch_api: bool = False
+    ) -> List[str]:
+        """
+        Draft several emails concurrently.
+        
+        Args:
+            items: (client_summary, email_type, additional_context) for each email
+            use_batch_api: With OpenAI, submit all drafts as one Batch API job instead
+                (half price, but can take minutes to hours - for non-urgent runs)
+        
+        Returns:
+            Drafts in the same order as items
+        """
+        requests = [self._email_request(*item) for item in items]
+        
+        if use_batch_api and isinstance(self.provider, OpenAIProvider):
+            return await self.provider.abatch_chat(
+                [self._build_messages(prompt, context, None) for prompt, context in requests],
+                temperature=0.7
+            )
+        
+        # Stay within the provider's requests-per-minute limits
+        limiter = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        
+        async def draft(prompt: str, context: str) -> str:
+            async with limiter:
+                return await self.achat(user_message=prompt, context=context, temperature=0.7)
+        
+        async with async_http_pool():
+            return await asyncio.gather(*(draft(prompt, context) for prompt, context in requests))
+    
+    def _email_request(
+        self,
+        client_summary: Dict[str, Any],
+        email_type: str,
+        additional_context: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """Build the (prompt, context) pair for drafting an email"""
         context = f"CLIENT DATA:\n{self._format_client_context(client_summary)}"
         if additional_context:
             context += f"\n\nADDITIONAL CONTEXT:\n{additional_context}"
         
-        format_instructions = """
-
-FORMAT REQUIREMENTS:
-- Start directly with "Subject:" line (no markdown heading)
-- Then a blank line
-- Then "Dear [Name]," greeting
-- Write 2-4 paragraphs of body text
-- End with appropriate sign-off like "Kind regards," or "Best wishes,"
-- Sign off with "[Advisor Name]" as placeholder (this email will be sent by the financial advisor, NOT by an AI)
-- Do NOT use any markdown headings (no # symbols)
-- Do NOT use bold or italic formatting
-- Keep it as plain text email format
-- Do NOT sign as "Jarvis" or any AI - this is a draft for the human advisor to send"""
-        
-        prompts = {
-            "birthday": f"Draft a warm birthday email for this client. Make it personal by referencing what you know about them (family, interests, recent conversations).{format_instructions}",
-            "review_reminder": f"Draft a professional email reminding this client their annual review is due. Emphasize the value of the review and what you'll cover.{format_instructions}",
-            "check_in": f"Draft a friendly check-in email. Reference any concerns they've expressed or life events happening.{format_instructions}",
-            "follow_up": f"Draft a follow-up email. Reference any commitments made or actions pending.{format_instructions}",
-            "policy_renewal": f"Draft an email about their upcoming policy renewal. Explain the importance of reviewing their cover.{format_instructions}",
-            "policy_maturity": f"Draft an email about their policy reaching maturity. Explain the options available to them.{format_instructions}",
-            "retirement_planning": f"Draft an email about retirement planning. Reference their retirement timeline and any concerns.{format_instructions}",
-            "general_update": f"Draft a general update email. Keep it friendly and reference recent conversations or their situation.{format_instructions}",
-        }
-        
-        prompt = prompts.get(email_type, f"Draft a {email_type} email for this client.{format_instructions}")
+        prompt = _EMAIL_PROMPTS.get(email_type) or f"Draft a {email_type} email for this client.{_FORMAT_INSTRUCTIONS}"
         
-        return self.chat(user_message=prompt, context=context, temperature=0.7)
+        return prompt, context
     
     def _format_briefing_context(self, data: Dict[str, Any]) -> str:
         """Format briefing data for LLM context"""
         lines = [f"Total clients: {data.get('total_clients', 0)}"]
         
-        if data.get('reviews_overdue'):
-            lines.append(f"\nOVERDUE REVIEWS ({len(data['reviews_overdue'])}):")
-            for c in data['reviews_overdue'][:5]:
-                lines.append(f"  - {c.full_name}: review was due {c.compliance.next_review_due}")
-        
-        if data.get('dormant_90_days'):
-            lines.append(f"\nDORMANT CLIENTS - NO CONTACT 90+ DAYS ({len(data['dormant_90_days'])}):")
-            for c in data['dormant_90_days'][:5]:
-                lines.append(f"  - {c.full_name}: {c.days_since_last_contact} days since contact")
-        
-        if data.get('upcoming_birthdays'):
-            lines.append(f"\nUPCOMING BIRTHDAYS:")
-            for b in data['upcoming_birthdays'][:5]:
-                milestone = " (MILESTONE!)" if b['is_milestone'] else ""
-                lines.append(f"  - {b['client'].full_name}: turning {b['turning_age']} in {b['days_until']} days{milestone}")
-        
-        if data.get('overdue_follow_ups'):
-            lines.append(f"\nOVERDUE FOLLOW-UPS ({len(data['overdue_follow_ups'])}):")
-            for c in data['overdue_follow_ups'][:5]:
-                for f in c.overdue_follow_ups:
-                    lines.append(f"  - {c.full_name}: {f.commitment} (was due {f.deadline})")
-        
-        if data.get('active_concerns'):
-            lines.append(f"\nCLIENTS WITH ACTIVE CONCERNS ({len(data['active_concerns'])}):")
-            for c in data['active_concerns'][:5]:
-                concerns = ", ".join([con.topic for con in c.active_concerns])
-                lines.append(f"  - {c.full_name}: {concerns}")
+        for key, header, format_item in _BRIEFING_SECTIONS:
+            items = data.get(key)
+            if items:
+                lines.append(header.format(count=len(items)))
+                for item in islice(items, 5):
+                    lines.extend(format_item(item))
         
         return "\n".join(lines)
     
     def _format_client_context(self, summary: Dict[str, Any]) -> str:
         """Format client summary for LLM context"""
-        import json
+        if orjson is not None:
+            try:
+                return orjson.dumps(
+                    summary, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=str
+                ).decode("utf-8")
+            except TypeError:
+                pass  # e.g. integers wider than 64 bits; the stdlib encoder handles them
         return json.dumps(summary, indent=2, default=str)
@@ -4,16 +4,137 @@ ChromaDB-based semantic search for client data
 """
 
 import os
+import re
 import json
-from typing import List, Dict, Any, Optional
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, FrozenSet, Tuple
 from datetime import date, datetime
 
-# Import config
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+# Import config (the repo root is on sys.path when the app runs: streamlit run app.py)
+from config import CHROMA_PERSIST_DIR, CHROMA_HOST, CHROMA_PORT
 
-from config import CHROMA_PERSIST_DIR
+# Disable ChromaDB telemetry completely (must happen before chromadb is imported)
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+os.environ["CHROMA_TELEMETRY"] = "False"
+
+# Monkey-patch posthog to prevent telemetry errors
+try:
+    import posthog
+    posthog.capture = lambda *args, **kwargs: None
+    posthog.identify = lambda *args, **kwargs: None
+except ImportError:
+    pass
+
+try:
+    import chromadb
+    from chromadb.config import Settings
+    _CHROMA_OK = True
+except ImportError:
+    chromadb = None
+    Settings = None
+    _CHROMA_OK = False
+
+
+def _keyword_pattern(keywords) -> re.Pattern:
+    """
+    One pattern reporting every keyword occurrence in a text.
+    The lookahead keeps overlapping keywords, matching the substring
+    checks it stands in for.
+    """
+    return re.compile("(?=(" + "|".join(map(re.escape, keywords)) + "))")
+
+
+# Substring keyword -> theme it signals, per document type
+_CONCERN_THEMES = {
+    "retire": "retire", "tax": "tax", "iht": "tax", "care": "care",
+    "protection": "protection", "insurance": "protection",
+    "income": "income", "money": "income",
+}
+_LIFE_EVENT_THEMES = {
+    "university": "education", "school": "education", "wedding": "wedding",
+    "retire": "retire", "birthday": "birthday",
+}
+_FOLLOWUP_THEMES = {
+    "insurance": "protection", "protection": "protection", "cover": "protection",
+    "pension": "pension", "tax": "tax",
+    "will": "estate", "lpa": "estate", "estate": "estate",
+}
+_DB_PENSION_PATTERN = re.compile("DB|Defined Benefit|Final Salary")
+
+# Theme / policy type / relationship -> related-topic keywords it adds
+_CONCERN_KEYWORDS = {
+    "retire": frozenset({"retirement", "pension", "stopping work"}),
+    "tax": frozenset({"inheritance tax", "IHT", "estate planning", "death duties"}),
+    "care": frozenset({"care home", "long term care", "elderly care", "care costs"}),
+    "protection": frozenset({"life insurance", "critical illness", "income protection", "protection gap"}),
+    "income": frozenset({"running out of money", "income sustainability", "financial security"}),
+}
+_POLICY_KEYWORDS = {
+    "pension": frozenset({"pension", "retirement savings", "SIPP", "workplace pension"}),
+    "isa": frozenset({"ISA", "tax-free savings", "stocks and shares ISA"}),
+    "life_insurance": frozenset({"life insurance", "life cover", "protection"}),
+}
+_DB_PENSION_KEYWORDS = frozenset({"defined benefit", "DB pension", "final salary"})
+_FAMILY_KEYWORDS = {
+    "child": frozenset({"children", "kids", "family"}),
+    "grandchild": frozenset({"grandchildren", "grandkids"}),
+    "spouse": frozenset({"married", "spouse", "partner", "couple"}),
+}
+_LIFE_EVENT_KEYWORDS = {
+    "education": frozenset({"education", "university", "school fees"}),
+    "wedding": frozenset({"wedding", "marriage"}),
+    "retire": frozenset({"retirement"}),
+    "birthday": frozenset({"birthday", "milestone"}),
+}
+_FOLLOWUP_KEYWORDS = {
+    "protection": frozenset({"protection review"}),
+    "pension": frozenset({"pension planning"}),
+    "tax": frozenset({"tax planning"}),
+    "estate": frozenset({"estate planning"}),
+}
+
+
+# Overview document layout; each field after the name expands to "\n<Label>: <value>" or ""
+_OVERVIEW_TEMPLATE = (
+    "Client: {name}{age}{occupation}{employer}{income}{marital_status}{location}"
+    "{portfolio}{client_since}{advisor}{tags}{notes}{risk}"
+)
+
+
+class _ThemeTagger:
+    """
+    Maps text to related-topic keywords through a bitmask of themes.
+    Each theme owns one bit, every matched keyword ORs in its theme's bit,
+    and the keyword union for every possible mask is precomputed, so tagging
+    a client is one regex scan plus a table lookup.
+    """
+    
+    def __init__(self, themes: Dict[str, str], keywords: Dict[str, FrozenSet[str]]):
+        theme_bits = {theme: 1 << i for i, theme in enumerate(keywords)}
+        self.pattern = _keyword_pattern(themes)
+        self.bits = {keyword: theme_bits[theme] for keyword, theme in themes.items()}
+        self.topics_by_mask = [
+            frozenset().union(*(keywords[theme] for theme, bit in theme_bits.items() if mask & bit))
+            for mask in range(1 << len(theme_bits))
+        ]
+    
+    def topics(self, texts: List[str]) -> FrozenSet[str]:
+        """Related topics for the texts, joined and lower-cased once and scanned in one pass"""
+        mask = 0
+        for keyword in self.pattern.findall(" ".join(texts).lower()):
+            mask |= self.bits[keyword]
+        return self.topics_by_mask[mask]
+
+
+_CONCERN_TAGGER = _ThemeTagger(_CONCERN_THEMES, _CONCERN_KEYWORDS)
+_LIFE_EVENT_TAGGER = _ThemeTagger(_LIFE_EVENT_THEMES, _LIFE_EVENT_KEYWORDS)
+_FOLLOWUP_TAGGER = _ThemeTagger(_FOLLOWUP_THEMES, _FOLLOWUP_KEYWORDS)
 
 
 class VectorStoreService:
@@ -25,44 +146,48 @@ class VectorStoreService:
     - "clients with DB pensions"
     """
     
+    # Document kinds indexed per client; ids are f"{client_id}_{doc_type}"
+    DOC_TYPES = ("overview", "concerns", "policies", "family", "notes", "followups")
+    # Documents per collection.upsert call when bulk indexing
+    UPSERT_BATCH_SIZE = 200
+    # sqlite map of document id -> content hash, kept beside Chroma's own files
+    HASH_STORE_FILE = "doc_hashes.sqlite3"
+    # Recent search results kept in memory; dropped whenever the index changes
+    QUERY_CACHE_SIZE = 256
+    
     def __init__(self, persist_directory: str = None):
         self.persist_directory = persist_directory or CHROMA_PERSIST_DIR
         self.client = None
         self.collection = None
         self._initialized = False
+        self._available = False
+        self._hash_db = None
+        self._hashes: Dict[str, str] = {}  # in-memory mirror of the doc_hashes table
+        self._hash_lock = threading.Lock()
+        # (generation, kind, query, n_results, doc_type) -> results
+        self._query_cache: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._query_generation = 0
+        self._query_lock = threading.Lock()
         
         self._initialize()
     
     def _initialize(self):
         """Initialize ChromaDB client and collection"""
+        if not _CHROMA_OK:
+            print("ChromaDB not installed. Run: pip install chromadb")
+            return
+        
         try:
-            # Disable ChromaDB telemetry completely
-            import os as _os
-            _os.environ["ANONYMIZED_TELEMETRY"] = "False"
-            _os.environ["CHROMA_TELEMETRY"] = "False"
-            
-            # Monkey-patch posthog to prevent telemetry errors
-            try:
-                import posthog
-                posthog.capture = lambda *args, **kwargs: None
-                posthog.identify = lambda *args, **kwargs: None
-            except ImportError:
-                pass
-            
-            import chromadb
-            from chromadb.config import Settings
-            
             # Create persist directory if needed
             os.makedirs(self.persist_directory, exist_ok=True)
             
-            # Initialize persistent client with telemetry disabled
-            self.client = chromadb.PersistentClient(
-                path=self.persist_directory,
-                settings=Settings(
-                    anonymized_telemetry=False,
-                    allow_reset=True
-                )
-            )
+            # Initialize client with telemetry disabled: a Chroma server when
+            # one is configured, otherwise the local persistent store
+            settings = Settings(anonymized_telemetry=False, allow_reset=True)
+            if CHROMA_HOST:
+                self.client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT, settings=settings)
+            else:
+                self.client = chromadb.PersistentClient(path=self.persist_directory, settings=settings)
             
             # Get or create collection for client data
             self.collection = self.client.get_or_create_collection(
@@ -70,104 +195,137 @@ class VectorStoreService:
                 metadata={"description": "Financial advisor client information"}
             )
             
+            self._open_hash_store()
+            
             self._initialized = True
+            self._available = True
             print(f"Vector store initialized. Collection has {self.collection.count()} documents.")
             
-        except ImportError:
-            print("ChromaDB not installed. Run: pip install chromadb")
-            self._initialized = False
         except Exception as e:
             print(f"Error initializing vector store: {e}")
             self._initialized = False
     
     def is_available(self) -> bool:
         """Check if vector store is available"""
-        return self._initialized and self.collection is not None
+        return self._available
+    
+    # ============== Content Hash Store ==============
+    
+    def _open_hash_store(self):
+        """Open the document hash store used to skip unchanged documents"""
+        try:
+            self._hash_db = sqlite3.connect(
+                os.path.join(self.persist_directory, self.HASH_STORE_FILE),
+                check_same_thread=False
+            )
+            with self._hash_db:
+                self._hash_db.execute(
+                    "CREATE TABLE IF NOT EXISTS doc_hashes (id TEXT PRIMARY KEY, hash TEXT NOT NULL)"
+                )
+                # Hashes are meaningless without the documents they describe
+                if self.collection.count() == 0:
+                    self._hash_db.execute("DELETE FROM doc_hashes")
+            # Lookups are served from memory; sqlite only persists across runs
+            self._hashes = dict(self._hash_db.execute("SELECT id, hash FROM doc_hashes"))
+        except sqlite3.Error as e:
+            print(f"Document hash store unavailable, re-indexing everything: {e}")
+            self._hash_db = None
+            self._hashes = {}
+    
+    @staticmethod
+    def _content_hash(document: str) -> str:
+        return hashlib.blake2b(document.encode(), digest_size=16).hexdigest()
+    
+    def _changed_rows(self, documents: List[str], ids: List[str]) -> Tuple[List[int], List[str]]:
+        """
+        Compare documents against the hashes recorded when they were last indexed.
+        Returns (positions of changed documents, content hash of every document).
+        """
+        hashes = [self._content_hash(doc) for doc in documents]
+        stored = self._hashes
+        return [i for i, doc_id in enumerate(ids) if stored.get(doc_id) != hashes[i]], hashes
+    
+    def _record_hashes(self, ids: List[str], hashes: List[str]):
+        """Remember the content hashes of documents that were just upserted"""
+        if self._hash_db is None or not ids:
+            return
+        with self._hash_lock, self._hash_db:
+            self._hash_db.executemany(
+                "INSERT OR REPLACE INTO doc_hashes (id, hash) VALUES (?, ?)",
+                zip(ids, hashes)
+            )
+            self._hashes.update(zip(ids, hashes))
+    
+    def _clear_hashes(self):
+        if self._hash_db is None:
+            return
+        with self._hash_lock, self._hash_db:
+            self._hash_db.execute("DELETE FROM doc_hashes")
+            self._hashes.clear()
+    
+    def _forget_hashes(self, ids: List[str]):
+        """Drop recorded hashes for documents that were deleted"""
+        if self._hash_db is None:
+            return
+        with self._hash_lock, self._hash_db:
+            self._hash_db.executemany("DELETE FROM doc_hashes WHERE id = ?", [(doc_id,) for doc_id in ids])
+            for doc_id in ids:
+                self._hashes.pop(doc_id, None)
+    
+    # ============== Query Cache ==============
+    
+    def _cached_query(self, key: Tuple) -> Tuple[Tuple, Any]:
+        """
+        Look up a query in the result cache.
+        Returns (full cache key, cached results or None); the key carries the
+        current index generation so results computed before a write never land.
+        """
+        with self._query_lock:
+            full_key = (self._query_generation,) + key
+            cached = self._query_cache.get(full_key)
+            if cached is not None:
+                self._query_cache.move_to_end(full_key)
+            return full_key, cached
+    
+    def _store_query(self, full_key: Tuple, results: Any):
+        with self._query_lock:
+            if full_key[0] != self._query_generation:
+                return
+            self._query_cache[full_key] = results
+            if len(self._query_cache) > self.QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+    
+    def _invalidate_queries(self):
+        """Forget cached search results after the index changes"""
+        with self._query_lock:
+            self._query_generation += 1
+            self._query_cache.clear()
     
     def index_client(self, client) -> bool:
         """
         Index a single client's data for semantic search.
         Creates multiple documents per client for different aspects.
         """
-        if not self.is_available():
+        if not self._available:
             return False
         
         try:
-            documents = []
-            metadatas = []
-            ids = []
-            
-            # 1. Client Overview Document
-            overview = self._create_overview_document(client)
-            documents.append(overview)
-            metadatas.append({
-                "client_id": client.id,
-                "doc_type": "overview",
-                "client_name": client.full_name
-            })
-            ids.append(f"{client.id}_overview")
-            
-            # 2. Concerns Document (if any)
-            if client.concerns:
-                concerns_doc = self._create_concerns_document(client)
-                documents.append(concerns_doc)
-                metadatas.append({
-                    "client_id": client.id,
-                    "doc_type": "concerns",
-                    "client_name": client.full_name
-                })
-                ids.append(f"{client.id}_concerns")
+            documents, metadatas, ids = self._build_client_docs(client)
+            rows, hashes = self._changed_rows(documents, ids)
+            if not rows:
+                return True
             
-            # 3. Policies Document
-            if client.policies:
-                policies_doc = self._create_policies_document(client)
-                documents.append(policies_doc)
-                metadatas.append({
-                    "client_id": client.id,
-                    "doc_type": "policies",
-                    "client_name": client.full_name
-                })
-                ids.append(f"{client.id}_policies")
-            
-            # 4. Family & Life Events Document
-            if client.family_members or client.life_events:
-                family_doc = self._create_family_document(client)
-                documents.append(family_doc)
-                metadatas.append({
-                    "client_id": client.id,
-                    "doc_type": "family",
-                    "client_name": client.full_name
-                })
-                ids.append(f"{client.id}_family")
-            
-            # 5. Meeting Notes Document (if any)
-            if client.meeting_notes:
-                notes_doc = self._create_notes_document(client)
-                documents.append(notes_doc)
-                metadatas.append({
-                    "client_id": client.id,
-                    "doc_type": "notes",
-                    "client_name": client.full_name
-                })
-                ids.append(f"{client.id}_notes")
-            
-            # 6. Follow-ups Document (if any)
-            if client.follow_ups:
-                followups_doc = self._create_followups_document(client)
-                documents.append(followups_doc)
-                metadatas.append({
-                    "client_id": client.id,
-                    "doc_type": "followups",
-                    "client_name": client.full_name
-                })
-                ids.append(f"{client.id}_followups")
-            
-            # Upsert all documents for this client
-            self.collection.upsert(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
+            # Upsert the changed documents for this client
+            changed_ids = [ids[i] for i in rows]
+            try:
+                self.collection.upsert(
+                    documents=[documents[i] for i in rows],
+                    metadatas=[metadatas[i] for i in rows],
+                    ids=changed_ids
+                )
+            finally:
+                self._invalidate_queries()
+            self._record_hashes(changed_ids, [hashes[i] for i in rows])
             
             return True
             
@@ -175,20 +333,126 @@ class VectorStoreService:
             print(f"Error indexing client {client.id}: {e}")
             return False
     
-    def index_all_clients(self, clients: List) -> int:
-        """Index all clients. Returns count of successfully indexed."""
-        if not self.is_available():
+    def index_all_clients(self, clients: List, max_workers: Optional[int] = None) -> int:
+        """
+        Index all clients. Returns count of successfully indexed.
+        Documents are built on a thread pool, accumulated across clients and
+        upserted in batches of UPSERT_BATCH_SIZE rather than one upsert per
+        client; documents whose content hash is unchanged since the last run
+        are skipped. Chroma writes stay on the calling thread.
+        """
+        if not self._available:
             return 0
         
         print(f"Starting to index {len(clients)} clients...", flush=True)
-        success_count = 0
-        for client in clients:
-            if self.index_client(client):
-                success_count += 1
+        batches, indexed = self._prepare_upserts(clients, max_workers)
         
+        # A failed batch only loses the clients whose documents it carried
+        failed = set()
+        for documents, metadatas, ids, hashes, owners in batches:
+            try:
+                self.collection.upsert(documents=documents, metadatas=metadatas, ids=ids)
+                self._record_hashes(ids, hashes)
+            except Exception as e:
+                print(f"Error upserting {len(ids)} documents: {e}")
+                failed.update(owners)
+        if batches:
+            self._invalidate_queries()
+        
+        success_count = indexed - len(failed)
         print(f"Indexed {success_count}/{len(clients)} clients. Total documents: {self.collection.count()}", flush=True)
         return success_count
     
+    async def index_all_clients_async(self, clients: List, max_workers: Optional[int] = None) -> int:
+        """
+        Async variant of index_all_clients.
+        Against a Chroma server (CHROMA_HOST) the batches are sent concurrently
+        through AsyncHttpClient; the local persistent store only supports
+        single-threaded writes, so there (or on a chromadb without
+        AsyncHttpClient) the sync path runs in a worker thread.
+        """
+        if not self._available:
+            return 0
+        # AsyncHttpClient only exists in newer chromadb releases
+        if not CHROMA_HOST or not hasattr(chromadb, "AsyncHttpClient"):
+            return await asyncio.to_thread(self.index_all_clients, clients, max_workers)
+        
+        print(f"Starting to index {len(clients)} clients...", flush=True)
+        client = await chromadb.AsyncHttpClient(
+            host=CHROMA_HOST, port=CHROMA_PORT,
+            settings=Settings(anonymized_telemetry=False, allow_reset=True)
+        )
+        collection = await client.get_or_create_collection(
+            name="client_data",
+            metadata={"description": "Financial advisor client information"}
+        )
+        batches, indexed = await asyncio.to_thread(self._prepare_upserts, clients, max_workers)
+        
+        results = await asyncio.gather(
+            *(collection.upsert(documents=documents, metadatas=metadatas, ids=ids)
+              for documents, metadatas, ids, _, _ in batches),
+            return_exceptions=True
+        )
+        
+        failed = set()
+        for (_, _, ids, hashes, owners), result in zip(batches, results):
+            if isinstance(result, Exception):
+                print(f"Error upserting {len(ids)} documents: {result}")
+                failed.update(owners)
+            else:
+                self._record_hashes(ids, hashes)
+        if batches:
+            self._invalidate_queries()
+        
+        success_count = indexed - len(failed)
+        print(f"Indexed {success_count}/{len(clients)} clients. Total documents: {await collection.count()}", flush=True)
+        return success_count
+    
+    def _prepare_upserts(self, clients: List, max_workers: Optional[int] = None) -> Tuple[List[tuple], int]:
+        """
+        Build every client's documents, drop the unchanged ones and split the
+        rest into upsert batches of (documents, metadatas, ids, hashes, owners),
+        where owners are the positions of the clients the batch carries.
+        Returns (batches, number of clients whose documents were built).
+        """
+        documents = []
+        metadatas = []
+        ids = []
+        owners = []  # index of the client each document belongs to
+        indexed = 0
+        workers = min(max_workers or os.cpu_count() or 1, max(len(clients), 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._build_client_docs, client) for client in clients]
+        for client, future in zip(clients, futures):
+            try:
+                client_docs, client_metas, client_ids = future.result()
+            except Exception as e:
+                print(f"Error indexing client {client.id}: {e}")
+                continue
+            documents.extend(client_docs)
+            metadatas.extend(client_metas)
+            ids.extend(client_ids)
+            owners.extend([indexed] * len(client_ids))
+            indexed += 1
+        
+        # Only documents that changed since the last run need embedding
+        rows, hashes = self._changed_rows(documents, ids)
+        if len(rows) < len(ids):
+            print(f"Skipping {len(ids) - len(rows)} unchanged documents.", flush=True)
+        
+        batches = []
+        batch = self.UPSERT_BATCH_SIZE
+        for start in range(0, len(rows), batch):
+            chunk = rows[start:start + batch]
+            batches.append((
+                [documents[i] for i in chunk],
+                [metadatas[i] for i in chunk],
+                [ids[i] for i in chunk],
+                [hashes[i] for i in chunk],
+                {owners[i] for i in chunk},
+            ))
+        return batches, indexed
+    
     def search(self, query: str, n_results: int = 5, doc_type: str = None) -> List[Dict[str, Any]]:
         """
         Semantic search across client data.
@@ -201,9 +465,13 @@ class VectorStoreService:
         Returns:
             List of matching documents with metadata and distances
         """
-        if not self.is_available():
+        if not self._available:
             return []
         
+        cache_key, cached = self._cached_query(("search", query, n_results, doc_type))
+        if cached is not None:
+            return cached
+        
         try:
             where_filter = None
             if doc_type:
@@ -219,14 +487,16 @@ class VectorStoreService:
             # Format results
             formatted = []
             if results and results['ids'] and results['ids'][0]:
-                for i, doc_id in enumerate(results['ids'][0]):
-                    formatted.append({
-                        "id": doc_id,
-                        "document": results['documents'][0][i] if results['documents'] else "",
-                        "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
-                        "distance": results['distances'][0][i] if results['distances'] else 0
-                    })
+                ids = results['ids'][0]
+                documents = results['documents'][0] if results['documents'] else [""] * len(ids)
+                metadatas = results['metadatas'][0] if results['metadatas'] else [{}] * len(ids)
+                distances = results['distances'][0] if results['distances'] else [0] * len(ids)
+                formatted = [
+                    {"id": doc_id, "document": document, "metadata": metadata, "distance": distance}
+                    for doc_id, document, metadata, distance in zip(ids, documents, metadatas, distances)
+                ]
             
+            self._store_query(cache_key, formatted)
             return formatted
             
         except Exception as e:
@@ -236,20 +506,37 @@ class VectorStoreService:
     def search_clients(self, query: str, n_results: int = 5) -> List[str]:
         """
         Search and return unique client IDs matching the query.
+        Only metadata is fetched; documents and distances are never used here.
         """
-        results = self.search(query, n_results=n_results * 2)  # Get more to dedupe
+        if not self._available:
+            return []
+        
+        cache_key, cached = self._cached_query(("clients", query, n_results, None))
+        if cached is not None:
+            return cached
+        
+        try:
+            results = self.collection.query(
+                query_texts=[query],
+                n_results=n_results * 2,  # Get more to dedupe
+                include=["metadatas"]
+            )
+        except Exception as e:
+            print(f"Search error: {e}")
+            return []
         
         seen_clients = set()
         client_ids = []
         
-        for result in results:
-            client_id = result.get('metadata', {}).get('client_id')
+        for metadata in (results['metadatas'][0] if results and results.get('metadatas') else []):
+            client_id = (metadata or {}).get('client_id')
             if client_id and client_id not in seen_clients:
                 seen_clients.add(client_id)
                 client_ids.append(client_id)
                 if len(client_ids) >= n_results:
                     break
         
+        self._store_query(cache_key, client_ids)
         return client_ids
     
     def get_relevant_context(self, query: str, n_results: int = 3) -> str:
@@ -276,166 +563,211 @@ class VectorStoreService:
     
     def clear_collection(self):
         """Clear all documents from the collection"""
-        if self.is_available():
-            # Delete and recreate collection
-            self.client.delete_collection("client_data")
-            self.collection = self.client.create_collection(
-                name="client_data",
-                metadata={"description": "Financial advisor client information"}
-            )
+        if self._available:
+            # Delete the documents but keep the collection (and its index) in place;
+            # every document carries a client_id, so this matches all of them
+            self.collection.delete(where={"client_id": {"$ne": ""}})
+            self._clear_hashes()
+            self._invalidate_queries()
             print("Collection cleared.")
     
+    def reset_client(self, client_id: str) -> bool:
+        """Remove every indexed document for one client"""
+        if not self._available:
+            return False
+        
+        ids = [f"{client_id}_{doc_type}" for doc_type in self.DOC_TYPES]
+        try:
+            self.collection.delete(ids=ids)
+        except Exception as e:
+            print(f"Error removing client {client_id} from index: {e}")
+            return False
+        finally:
+            self._invalidate_queries()
+        self._forget_hashes(ids)
+        return True
+    
     # ============== Document Creation Helpers ==============
     
-    def _create_overview_document(self, client) -> str:
+    def _build_client_docs(self, client) -> Tuple[List[str], List[Dict[str, Any]], List[str]]:
+        """Build (documents, metadatas, ids) for every aspect of a client"""
+        # full_name is a computed property; resolve it and the id once
+        name = client.full_name
+        cid = client.id
+        base_meta = {"client_id": cid, "client_name": name}
+        documents = []
+        metadatas = []
+        ids = []
+        
+        # 1. Client Overview Document
+        documents.append(self._create_overview_document(client, name))
+        metadatas.append({**base_meta, "doc_type": "overview"})
+        ids.append(f"{cid}_overview")
+        
+        # 2. Concerns Document (if any)
+        if client.concerns:
+            documents.append(self._create_concerns_document(client, name))
+            metadatas.append({**base_meta, "doc_type": "concerns"})
+            ids.append(f"{cid}_concerns")
+        
+        # 3. Policies Document
+        if client.policies:
+            documents.append(self._create_policies_document(client, name))
+            metadatas.append({**base_meta, "doc_type": "policies"})
+            ids.append(f"{cid}_policies")
+        
+        # 4. Family & Life Events Document
+        if client.family_members or client.life_events:
+            documents.append(self._create_family_document(client, name))
+            metadatas.append({**base_meta, "doc_type": "family"})
+            ids.append(f"{cid}_family")
+        
+        # 5. Meeting Notes Document (if any)
+        if client.meeting_notes:
+            documents.append(self._create_notes_document(client, name))
+            metadatas.append({**base_meta, "doc_type": "notes"})
+            ids.append(f"{cid}_notes")
+        
+        # 6. Follow-ups Document (if any)
+        if client.follow_ups:
+            documents.append(self._create_followups_document(client, name))
+            metadatas.append({**base_meta, "doc_type": "followups"})
+            ids.append(f"{cid}_followups")
+        
+        return documents, metadatas, ids
+    
+    def _create_overview_document(self, client, name: str) -> str:
         """Create searchable overview document for a client"""
-        parts = [
-            f"Client: {client.full_name}",
-            f"Age: {client.age}" if client.age else "",
-            f"Occupation: {client.occupation}" if client.occupation else "",
-            f"Employer: {client.employer}" if client.employer else "",
-            f"Annual Income: £{client.annual_income:,.0f}" if client.annual_income else "",
-            f"Marital Status: {client.marital_status}" if client.marital_status else "",
-            f"Location: {client.contact_info.address.city}, {client.contact_info.address.county}" if client.contact_info and client.contact_info.address else "",
-            f"Portfolio Value: £{client.total_portfolio_value:,.0f}" if client.total_portfolio_value else "",
-            f"Client Since: {client.client_since}" if client.client_since else "",
-            f"Advisor: {client.assigned_advisor}" if client.assigned_advisor else "",
-            f"Tags: {', '.join(client.tags)}" if client.tags else "",
-            f"Notes: {client.notes}" if client.notes else ""
-        ]
-        
-        if client.risk_profile:
-            parts.append(f"Risk Attitude: {client.risk_profile.attitude_to_risk.value}")
-            if client.risk_profile.notes:
-                parts.append(f"Risk Notes: {client.risk_profile.notes}")
-        
-        return "\n".join([p for p in parts if p])
+        contact = client.contact_info
+        risk_profile = client.risk_profile
+        risk = ""
+        if risk_profile:
+            risk = f"\nRisk Attitude: {risk_profile.attitude_to_risk.value}"
+            if risk_profile.notes:
+                risk += f"\nRisk Notes: {risk_profile.notes}"
+        
+        # Every optional segment carries its own leading newline, or is empty
+        return _OVERVIEW_TEMPLATE.format_map({
+            "name": name,
+            "age": f"\nAge: {client.age}" if client.age else "",
+            "occupation": f"\nOccupation: {client.occupation}" if client.occupation else "",
+            "employer": f"\nEmployer: {client.employer}" if client.employer else "",
+            "income": f"\nAnnual Income: £{client.annual_income:,.0f}" if client.annual_income else "",
+            "marital_status": f"\nMarital Status: {client.marital_status}" if client.marital_status else "",
+            "location": (f"\nLocation: {contact.address.city}, {contact.address.county}"
+                         if contact and contact.address else ""),
+            "portfolio": f"\nPortfolio Value: £{client.total_portfolio_value:,.0f}" if client.total_portfolio_value else "",
+            "client_since": f"\nClient Since: {client.client_since}" if client.client_since else "",
+            "advisor": f"\nAdvisor: {client.assigned_advisor}" if client.assigned_advisor else "",
+            "tags": f"\nTags: {', '.join(client.tags)}" if client.tags else "",
+            "notes": f"\nNotes: {client.notes}" if client.notes else "",
+            "risk": risk,
+        })
     
-    def _create_concerns_document(self, client) -> str:
+    def _create_concerns_document(self, client, name: str) -> str:
         """Create searchable concerns document"""
-        parts = [f"Concerns for {client.full_name}:"]
-        
-        for concern in client.concerns:
-            concern_text = f"- {concern.topic}"
-            if concern.details:
-                concern_text += f": {concern.details}"
-            concern_text += f" (Severity: {concern.severity.value}, Status: {concern.status.value})"
-            parts.append(concern_text)
-        
-        # Add keywords for common concern themes
-        concern_topics = [c.topic.lower() for c in client.concerns]
-        keywords = []
-        
-        if any('retire' in t for t in concern_topics):
-            keywords.extend(['retirement', 'pension', 'stopping work'])
-        if any('tax' in t or 'iht' in t for t in concern_topics):
-            keywords.extend(['inheritance tax', 'IHT', 'estate planning', 'death duties'])
-        if any('care' in t for t in concern_topics):
-            keywords.extend(['care home', 'long term care', 'elderly care', 'care costs'])
-        if any('protection' in t or 'insurance' in t for t in concern_topics):
-            keywords.extend(['life insurance', 'critical illness', 'income protection', 'protection gap'])
-        if any('income' in t or 'money' in t for t in concern_topics):
-            keywords.extend(['running out of money', 'income sustainability', 'financial security'])
-        
-        if keywords:
-            parts.append(f"Related topics: {', '.join(set(keywords))}")
+        def lines():
+            yield f"Concerns for {name}:"
+            
+            for concern in client.concerns:
+                if concern.details:
+                    yield f"- {concern.topic}: {concern.details} (Severity: {concern.severity.value}, Status: {concern.status.value})"
+                else:
+                    yield f"- {concern.topic} (Severity: {concern.severity.value}, Status: {concern.status.value})"
+            
+            # Add keywords for common concern themes
+            matched = _CONCERN_TAGGER.topics([c.topic for c in client.concerns])
+            
+            if matched:
+                yield f"Related topics: {', '.join(sorted(matched))}"
         
-        return "\n".join(parts)
+        return "\n".join(lines())
     
-    def _create_policies_document(self, client) -> str:
+    def _create_policies_document(self, client, name: str) -> str:
         """Create searchable policies document"""
-        parts = [f"Policies and investments for {client.full_name}:"]
-        
-        pension_total = 0
-        isa_total = 0
-        
-        for policy in client.policies:
-            policy_text = f"- {policy.policy_type.value}: {policy.provider}"
-            if policy.current_value:
-                policy_text += f" (£{policy.current_value:,.0f})"
-                if policy.policy_type.value == 'pension':
-                    pension_total += policy.current_value
-                elif policy.policy_type.value == 'isa':
-                    isa_total += policy.current_value
-            if policy.notes:
-                policy_text += f" - {policy.notes}"
-            parts.append(policy_text)
-        
-        # Add summary keywords
-        policy_types = [p.policy_type.value for p in client.policies]
-        keywords = []
-        
-        if 'pension' in policy_types:
-            keywords.extend(['pension', 'retirement savings', 'SIPP', 'workplace pension'])
-            # Check for DB pension
-            for p in client.policies:
-                if p.notes and ('DB' in p.notes or 'Defined Benefit' in p.notes or 'Final Salary' in p.notes):
-                    keywords.extend(['defined benefit', 'DB pension', 'final salary'])
-                    break
-        if 'isa' in policy_types:
-            keywords.extend(['ISA', 'tax-free savings', 'stocks and shares ISA'])
-        if 'life_insurance' in policy_types:
-            keywords.extend(['life insurance', 'life cover', 'protection'])
-        
-        parts.append(f"Total pension: £{pension_total:,.0f}")
-        parts.append(f"Total ISA: £{isa_total:,.0f}")
-        
-        if keywords:
-            parts.append(f"Related topics: {', '.join(set(keywords))}")
+        def lines():
+            yield f"Policies and investments for {name}:"
+            
+            pension_total = 0
+            isa_total = 0
+            policy_types = set()
+            has_db_pension = False
+            
+            # One pass collects the text, totals, types held and DB pension flag
+            for policy in client.policies:
+                pt = policy.policy_type.value
+                cv = policy.current_value
+                notes = policy.notes
+                policy_types.add(pt)
+                policy_text = f"- {pt}: {policy.provider}"
+                if cv:
+                    policy_text += f" (£{cv:,.0f})"
+                    if pt == 'pension':
+                        pension_total += cv
+                    elif pt == 'isa':
+                        isa_total += cv
+                if notes:
+                    policy_text += f" - {notes}"
+                    if not has_db_pension and _DB_PENSION_PATTERN.search(notes):
+                        has_db_pension = True
+                yield policy_text
+            
+            # Add summary keywords
+            matched = set()
+            for policy_type in policy_types:
+                if policy_type in _POLICY_KEYWORDS:
+                    matched |= _POLICY_KEYWORDS[policy_type]
+            if has_db_pension and 'pension' in policy_types:
+                matched |= _DB_PENSION_KEYWORDS
+            
+            yield f"Total pension: £{pension_total:,.0f}"
+            yield f"Total ISA: £{isa_total:,.0f}"
+            
+            if matched:
+                yield f"Related topics: {', '.join(sorted(matched))}"
         
-        return "\n".join(parts)
+        return "\n".join(lines())
     
-    def _create_family_document(self, client) -> str:
+    def _create_family_document(self, client, name: str) -> str:
         """Create searchable family and life events document"""
-        parts = [f"Family and life events for {client.full_name}:"]
-        
-        # Family members
-        if client.family_members:
-            parts.append("Family:")
-            for member in client.family_members:
-                member_text = f"- {member.name} ({member.relationship})"
-                if member.notes:
-                    member_text += f": {member.notes}"
-                parts.append(member_text)
-        
-        # Life events
-        if client.life_events:
-            parts.append("Upcoming life events:")
-            for event in client.life_events:
-                event_text = f"- {event.event_date}: {event.description}"
-                if event.related_person:
-                    event_text += f" (related to {event.related_person})"
-                parts.append(event_text)
-        
-        # Add keywords
-        keywords = []
-        if any(m.relationship == 'child' for m in client.family_members):
-            keywords.extend(['children', 'kids', 'family'])
-        if any(m.relationship == 'grandchild' for m in client.family_members):
-            keywords.extend(['grandchildren', 'grandkids'])
-        if any(m.relationship == 'spouse' for m in client.family_members):
-            keywords.extend(['married', 'spouse', 'partner', 'couple'])
-        
-        # Check life events for keywords
-        for event in client.life_events:
-            desc_lower = event.description.lower()
-            if 'university' in desc_lower or 'school' in desc_lower:
-                keywords.extend(['education', 'university', 'school fees'])
-            if 'wedding' in desc_lower:
-                keywords.extend(['wedding', 'marriage'])
-            if 'retire' in desc_lower:
-                keywords.extend(['retirement'])
-            if 'birthday' in desc_lower:
-                keywords.extend(['birthday', 'milestone'])
-        
-        if keywords:
-            parts.append(f"Related topics: {', '.join(set(keywords))}")
+        def lines():
+            yield f"Family and life events for {name}:"
+            
+            # Family members
+            if client.family_members:
+                yield "Family:"
+                for member in client.family_members:
+                    if member.notes:
+                        yield f"- {member.name} ({member.relationship}): {member.notes}"
+                    else:
+                        yield f"- {member.name} ({member.relationship})"
+            
+            # Life events
+            if client.life_events:
+                yield "Upcoming life events:"
+                for event in client.life_events:
+                    if event.related_person:
+                        yield f"- {event.event_date}: {event.description} (related to {event.related_person})"
+                    else:
+                        yield f"- {event.event_date}: {event.description}"
+            
+            # Add keywords
+            matched = set()
+            for relationship in {m.relationship for m in client.family_members}:
+                if relationship in _FAMILY_KEYWORDS:
+                    matched |= _FAMILY_KEYWORDS[relationship]
+            
+            # Check life events for keywords
+            matched |= _LIFE_EVENT_TAGGER.topics([e.description for e in client.life_events])
+            
+            if matched:
+                yield f"Related topics: {', '.join(sorted(matched))}"
         
-        return "\n".join(parts)
+        return "\n".join(lines())
     
-    def _create_notes_document(self, client) -> str:
+    def _create_notes_document(self, client, name: str) -> str:
         """Create searchable meeting notes document"""
-        parts = [f"Meeting notes for {client.full_name}:"]
+        parts = [f"Meeting notes for {name}:"]
         
         for note in client.meeting_notes[:3]:  # Last 3 meetings
             parts.append(f"\nMeeting on {note.meeting_date}:")
@@ -448,9 +780,9 @@ class VectorStoreService:
         
         return "\n".join(parts)
     
-    def _create_followups_document(self, client) -> str:
+    def _create_followups_document(self, client, name: str) -> str:
         """Create searchable follow-ups document"""
-        parts = [f"Follow-up commitments for {client.full_name}:"]
+        parts = [f"Follow-up commitments for {name}:"]
         
         for followup in client.follow_ups:
             status_emoji = "✅" if followup.status.value == "completed" else "⏰" if followup.status.value == "overdue" else "📋"
@@ -458,30 +790,25 @@ class VectorStoreService:
             parts.append(f"   Deadline: {followup.deadline} | Status: {followup.status.value}")
         
         # Add keywords for follow-up types
-        all_commitments = " ".join([f.commitment.lower() for f in client.follow_ups])
-        keywords = []
-        
-        if 'insurance' in all_commitments or 'protection' in all_commitments or 'cover' in all_commitments:
-            keywords.append('protection review')
-        if 'pension' in all_commitments:
-            keywords.append('pension planning')
-        if 'tax' in all_commitments:
-            keywords.append('tax planning')
-        if 'will' in all_commitments or 'lpa' in all_commitments or 'estate' in all_commitments:
-            keywords.append('estate planning')
+        matched = _FOLLOWUP_TAGGER.topics([f.commitment for f in client.follow_ups])
         
-        if keywords:
-            parts.append(f"Related topics: {', '.join(set(keywords))}")
+        if matched:
+            parts.append(f"Related topics: {', '.join(sorted(matched))}")
         
         return "\n".join(parts)
 
 
 # Singleton instance
 _vector_store_instance = None
+_vector_store_lock = threading.Lock()
 
+@lru_cache(maxsize=None)
 def get_vector_store() -> VectorStoreService:
     """Get or create singleton vector store instance"""
     global _vector_store_instance
-    if _vector_store_instance is None:
-        _vector_store_instance = VectorStoreService()
-    return _vector_store_instance
+    # lru_cache serves repeat calls, but concurrent first callers can both get
+    # here; only one may open the Chroma client
+    with _vector_store_lock:
+        if _vector_store_instance is None:
+            _vector_store_instance = VectorStoreService()
+        return _vector_store_instance
@@ -0,0 +1,97 @@
+"""
+Tests for spreadsheet parsing in the document parser
+"""
+
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+
+from services.document_parser import DocumentParser
+
+ROOT = Path(__file__).parent.parent
+
+# Sheet layouts and the fields the original whole-text parser extracted from them
+SHEETS = {
+    "client_header": (
+        [
+            ["CLIENT 13: JOHNS & WILLY JOHNS"],
+            ["Johns: Regional Radio Presenter – £68,000"],
+            ["Address: 12 High Street, Leeds, LS1 4AB"],
+            ["Net Worth: £450,000"],
+        ],
+        {
+            "first_name": "Johns", "last_name": "Johns",
+            "address_line1": "12 High Street, Leeds, LS1 4AB", "postcode": "LS1 4AB", "city": "Leeds",
+            "income": 68000.0, "portfolio": 450000.0, "occupation": "Regional Radio Presenter",
+        },
+    ),
+    "personal_details": (
+        [
+            ["PERSONAL DETAILS"],
+            ["Sarah Connor"],
+            ["Email", "sarah.connor@example.com"],
+            ["Lives in Bristol, BS1 5TR", None, "07700 900123"],
+        ],
+        {
+            "email": "sarah.connor@example.com", "first_name": "Sarah", "last_name": "Connor",
+            "phone": "07700 900123", "postcode": "BS1 5TR", "city": "in Bristol",
+        },
+    ),
+    "name_before_dob": (
+        [
+            ["Notes", None],
+            ["Peter Parker"],
+            ["DOB", "10/08/1975"],
+            ["Occupation", "Photographer"],
+            ["Salary", "£42,000"],
+        ],
+        {
+            "date_of_birth": "10/08/1975", "occupation": "Photographer", "income": "£42,000",
+            "first_name": "Peter", "last_name": "Parker",
+        },
+    ),
+    "labelled": (
+        [
+            ["Title", "Mr"],
+            ["First Name", "James"],
+            ["Surname", "Smith"],
+            ["Date of Birth", "01/02/1960"],
+            ["Marital Status", "Married"],
+            ["Address", "4 Mill Lane, York, YO1 7HH"],
+            ["Phone", "01904 123456"],
+        ],
+        {
+            "title": "Mr", "first_name": "James", "last_name": "Smith", "date_of_birth": "01/02/1960",
+            "marital_status": "Married", "address_line1": "4 Mill Lane, York, YO1 7HH",
+            "phone": "01904 123456", "postcode": "YO1 7HH", "city": "York",
+        },
+    ),
+}
+
+
+def _workbook_bytes(rows) -> bytes:
+    wb = openpyxl.Workbook()
+    for row in rows:
+        wb.active.append(row)
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("layout", sorted(SHEETS))
+def test_excel_layouts_match_original_parser(layout):
+    rows, expected = SHEETS[layout]
+    assert DocumentParser()._parse_excel(_workbook_bytes(rows)) == expected
+
+
+def test_sample_client_spreadsheet():
+    extracted = DocumentParser()._parse_excel((ROOT / "sample_client.xlsx").read_bytes())
+    assert extracted == {
+        "title": "Mr", "first_name": "David", "last_name": "Mitchell", "date_of_birth": "15/04/1975",
+        "email": "david.mitchell@techcorp.com", "phone": "07700 112233", "address_line1": "28 Oak Avenue",
+        "city": "Leeds", "postcode": "LS1 5DQ", "occupation": "IT Director", "employer": "Tech Solutions Ltd",
+        "income": "£125,000", "marital_status": "Married", "ni_number": "CD987654E",
+    }
@@ -0,0 +1,42 @@
+"""
+Tests for the vector store's document building
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# Build every client's documents and print their content hashes
+_HASH_SCRIPT = """
+import json
+from services.client_service import ClientService
+from services.vector_store import VectorStoreService
+
+store = VectorStoreService.__new__(VectorStoreService)
+hashes = {}
+for client in ClientService().get_all_clients():
+    documents, _, ids = store._build_client_docs(client)
+    hashes.update(zip(ids, map(store._content_hash, documents)))
+print(json.dumps(hashes))
+"""
+
+
+def _document_hashes(hash_seed: str) -> dict:
+    env = dict(os.environ, PYTHONHASHSEED=hash_seed)
+    output = subprocess.run(
+        [sys.executable, "-c", _HASH_SCRIPT],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_document_hashes_are_stable_across_hash_seeds():
+    # Persisted content hashes only skip re-embedding if a restart rebuilds identical text
+    first = _document_hashes("1")
+    second = _document_hashes("2")
+    assert first
+    assert first == second